@@ -1,13 +1,15 @@
 # blog/admin.py
 
 from django.contrib import admin
+from django.db.models import Count
 from django.utils import timezone
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 from treebeard.admin import TreeAdmin
 from treebeard.forms import movenodeform_factory
 
-from .models import Location, Tag, BlogPost, PostImage, PostRating, AboutPage, AboutPageImage, PostView
+from .models import Location, Tag, BlogPost, PostImage, PostRating, AboutPage, AboutPageImage, PostView, PostViewDaily
+from .search import search_post_ids
 
 
 # =============== ЛОКАЦИИ (древовидные) ===============
@@ -35,9 +37,13 @@ class TagAdmin(admin.ModelAdmin):
     prepopulated_fields = {"slug": ("name",)}
     search_fields = ("name",)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(posts_total=Count("posts"))
+
     def posts_count(self, obj):
-        return obj.posts.count()
+        return obj.posts_total
     posts_count.short_description = "Использований"
+    posts_count.admin_order_field = "posts_total"
 
 
 # =============== ГАЛЕРЕЯ (Inline) ===============
@@ -91,7 +97,8 @@ class BlogPostAdmin(admin.ModelAdmin):
         "tags",
         "author",
     )
-    search_fields = ("title", "content_markdown", "author__username")
+    # Текст поста ищется по полнотекстовому индексу (см. get_search_results)
+    search_fields = ("title", "author__username")
     prepopulated_fields = {"slug": ("title",)}
     date_hierarchy = "published_at"
     filter_horizontal = ("tags",)
@@ -99,6 +106,13 @@ class BlogPostAdmin(admin.ModelAdmin):
     readonly_fields = ("views_count", "created_at", "updated_at", "average_rating_display", "preview_button")
     save_on_top = True
 
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        post_ids = search_post_ids(search_term)
+        if post_ids:
+            results |= queryset.filter(pk__in=post_ids)
+        return results, may_have_duplicates
+
     def get_form(self, request, obj=None, **kwargs):
         form = super().get_form(request, obj, **kwargs)
         # Принудительно задаём ширину 100% для SEO-полей
@@ -293,8 +307,22 @@ class AboutPageAdmin(admin.ModelAdmin):
 class PostViewAdmin(admin.ModelAdmin):
     list_display = ("post", "ip_address", "created_at")
     list_filter = ("created_at", "post__location")
+    list_select_related = ("post",)
     search_fields = ("post__title", "ip_address")
     readonly_fields = ("post", "ip_address", "created_at")
     date_hierarchy = "created_at"
     def has_add_permission(self, request):
         return False
+
+
+@admin.register(PostViewDaily)
+class PostViewDailyAdmin(admin.ModelAdmin):
+    list_display = ("post", "date", "unique_visitors", "total_views")
+    list_filter = ("date",)
+    list_select_related = ("post",)
+    search_fields = ("post__title",)
+    readonly_fields = ("post", "date", "unique_visitors", "total_views")
+    date_hierarchy = "date"
+
+    def has_add_permission(self, request):
+        return False
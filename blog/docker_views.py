@@ -1,4 +1,50 @@
-from django.http import HttpResponse
+import hmac
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.http import Http404, HttpResponse, JsonResponse
+
+from . import metrics
+
+_migrations_applied = False
+
+
+def _pending_migrations():
+    """Неприменённые миграции; после первой успешной проверки БД больше не спрашиваем"""
+    global _migrations_applied
+    if _migrations_applied:
+        return []
+    executor = MigrationExecutor(connection)
+    pending = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    _migrations_applied = not pending
+    return pending
+
 
 def health_view(request):
-    return HttpResponse("OK")
\ No newline at end of file
+    """Готовность к трафику: БД отвечает и все миграции применены. Иначе 503"""
+    checks = {}
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        checks["database"] = "ok"
+        pending = _pending_migrations()
+        checks["migrations"] = "ok" if not pending else f"pending: {len(pending)}"
+    except DatabaseError as e:
+        checks.setdefault("database", f"error: {e}")
+
+    ready = all(value == "ok" for value in checks.values()) and "migrations" in checks
+    return JsonResponse(
+        {"status": "ok" if ready else "unavailable", "checks": checks},
+        status=200 if ready else 503,
+    )
+
+
+def metrics_view(request):
+    """Метрики всех воркеров для Prometheus (см. blog/metrics.py). Доступ — по METRICS_TOKEN"""
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if not metrics.ENABLED or not (token or settings.DEBUG):
+        raise Http404
+    if token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return HttpResponse("Unauthorized", status=401, headers={"WWW-Authenticate": "Bearer"})
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
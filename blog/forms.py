@@ -0,0 +1,18 @@
+# blog/forms.py
+from django.core.files.storage import default_storage
+from markdownx.forms import ImageForm
+
+from .image_variants import refresh_content_image, schedule
+
+
+class ContentImageForm(ImageForm):
+    """Загрузка картинки в редакторе markdownx; копии для srcset строятся в фоне"""
+
+    def _save(self, image, file_name, commit):
+        if not commit:
+            return super()._save(image, file_name, commit)
+        # Имя берём у хранилища, а не из URL: URL S3 может не начинаться с MEDIA_URL
+        path, image = super()._save(image, file_name, commit=False)
+        name = default_storage.save(path, image)
+        schedule(refresh_content_image, name)
+        return default_storage.url(name)
@@ -0,0 +1,264 @@
+# blog/image_variants.py
+"""
+Уменьшенные копии изображений в AVIF и WebP для srcset.
+
+Для каждого исходника в хранилище рядом с ним (в подпапке _variants/)
+создаются копии шириной IMAGE_VARIANT_WIDTHS. Список копий хранится в JSON-поле
+модели (cover_variants / image_variants) или, для картинок из Markdown,
+в ContentImage:
+    {"source": <имя исходника>, "width": ..., "height": ...,
+     "formats": {"avif": [[400, <имя>], ...], "webp": [...]},
+     "bytes": ..., "color": "#a1b2c3", "placeholder": "data:image/webp;base64,..."}
+
+Размеры, цвет и крошечная размытая заглушка пишутся туда же: шаблоны ставят
+width/height (без сдвига раскладки) и фон до загрузки картинки, не обращаясь к S3.
+
+Копии строятся после коммита в пуле потоков воркера — запрос на сохранение
+не ждёт Pillow. Пропущенное (рестарт воркера, старые файлы) догоняет
+команда build_image_variants.
+"""
+import base64
+import io
+import logging
+import posixpath
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils.html import escape
+from PIL import Image, ImageFilter, ImageOps, features
+
+from .page_cache import invalidate_pages
+
+logger = logging.getLogger(__name__)
+
+WIDTHS = tuple(getattr(settings, "IMAGE_VARIANT_WIDTHS", (400, 800, 1200, 1600)))
+# AVIF — только если Pillow собран с libavif
+FORMATS = tuple(fmt for fmt in ("avif", "webp") if features.check(fmt))
+QUALITY = {"avif": 55, "webp": 80}
+VARIANTS_DIR = "_variants"
+PLACEHOLDER_WIDTH = 16
+PLACEHOLDER_FORMAT = "webp" if features.check("webp") else "png"
+ASYNC = getattr(settings, "IMAGE_VARIANTS_ASYNC", True)
+WORKERS = getattr(settings, "IMAGE_VARIANTS_WORKERS", 2)
+
+# Картинки из текста постов занимают колонку статьи (max-w-4xl)
+CONTENT_SIZES = "(min-width: 896px) 896px, 100vw"
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def variant_name(name, width, fmt):
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, VARIANTS_DIR, f"{stem}-{width}w.{fmt}")
+
+
+def _open(name, storage):
+    """(изображение в RGB/RGBA с учётом EXIF-поворота, размер файла в байтах)"""
+    with storage.open(name, "rb") as source:
+        size = source.size
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+    if image.mode not in ("RGB", "RGBA"):
+        has_alpha = "A" in image.getbands() or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+    return image, size
+
+
+def _metadata(image, size):
+    """Размеры, преобладающий цвет и заглушка для уже открытого изображения"""
+    metadata = {"width": image.width, "height": image.height, "bytes": size, "color": None, "placeholder": ""}
+    # У прозрачных картинок фон-заглушка просвечивал бы и после загрузки
+    if image.mode == "RGBA" and image.getextrema()[3][0] < 255:
+        return metadata
+
+    sample = image.convert("RGB")
+    sample.thumbnail((64, 64))
+    palette = sample.quantize(colors=5, method=Image.Quantize.MEDIANCUT)
+    _, index = max(palette.getcolors())
+    red, green, blue = palette.getpalette()[index * 3:index * 3 + 3]
+    metadata["color"] = f"#{red:02x}{green:02x}{blue:02x}"
+
+    tiny = sample.resize(
+        (PLACEHOLDER_WIDTH, max(1, round(image.height * PLACEHOLDER_WIDTH / image.width))),
+        Image.Resampling.BOX,
+    ).filter(ImageFilter.GaussianBlur(1))
+    buffer = io.BytesIO()
+    tiny.save(buffer, format=PLACEHOLDER_FORMAT.upper(), quality=40)
+    encoded = base64.b64encode(buffer.getvalue()).decode("ascii")
+    metadata["placeholder"] = f"data:image/{PLACEHOLDER_FORMAT};base64,{encoded}"
+    return metadata
+
+
+def read_metadata(name, storage=default_storage):
+    """Только метаданные файла — для записей, у которых копии уже построены"""
+    return _metadata(*_open(name, storage))
+
+
+def has_metadata(variants):
+    return "bytes" in (variants or {})
+
+
+def build_variants(name, storage=default_storage):
+    """Строит копии файла name и возвращает их описание вместе с метаданными"""
+    image, size = _open(name, storage)
+
+    formats = {fmt: [] for fmt in FORMATS}
+    for width in sorted({min(width, image.width) for width in WIDTHS}):
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize(
+            (width, height), Image.Resampling.LANCZOS, reducing_gap=3.0
+        )
+        for fmt in FORMATS:
+            buffer = io.BytesIO()
+            resized.save(buffer, format=fmt.upper(), quality=QUALITY[fmt])
+            target = variant_name(name, width, fmt)
+            # Имена детерминированы — старую копию заменяем, а не плодим target_abc123
+            storage.delete(target)
+            formats[fmt].append([width, storage.save(target, ContentFile(buffer.getvalue()))])
+    return {"source": name, "formats": formats, **_metadata(image, size)}
+
+
+def delete_variants(variants, storage=default_storage):
+    for entries in (variants or {}).get("formats", {}).values():
+        for _, name in entries:
+            storage.delete(name)
+
+
+def srcset(variants, fmt):
+    """Строка для srcset: «url 400w, url 800w»"""
+    entries = (variants or {}).get("formats", {}).get(fmt, ())
+    return ", ".join(f"{default_storage.url(name)} {width}w" for width, name in entries)
+
+
+def picture_sources(variants):
+    """[(MIME-тип, srcset)] для <source> в порядке предпочтения"""
+    return [(f"image/{fmt}", srcset(variants, fmt)) for fmt in FORMATS if srcset(variants, fmt)]
+
+
+# =============== Поля моделей ===============
+def image_fields():
+    """{модель: (поле изображения, поле копий, группы кэша страниц)}"""
+    from .models import AboutPage, AboutPageImage, BlogPost, PostImage
+
+    return {
+        BlogPost: ("cover_image", "cover_variants", lambda obj: ("posts", f"post:{obj.slug}")),
+        PostImage: ("image", "image_variants", lambda obj: (f"post:{obj.post.slug}",)),
+        AboutPage: ("cover_image", "cover_variants", lambda obj: ("about",)),
+        AboutPageImage: ("image", "image_variants", lambda obj: ("about",)),
+    }
+
+
+def refresh_object_variants(model, pk, force=False):
+    """Строит копии для изображения объекта, если они устарели. Возвращает True, если строил"""
+    image_field, variants_field, page_groups = image_fields()[model]
+    obj = model.objects.filter(pk=pk).first()
+    if obj is None:
+        return False
+    name = getattr(obj, image_field).name
+    old = getattr(obj, variants_field) or {}
+    fresh = old.get("source") == (name or None)
+    built = not fresh or force
+    if not built:
+        if not name or has_metadata(old):
+            return False
+        # Копии построены до появления метаданных — дочитываем только их
+        variants = {**old, **read_metadata(name)}
+    else:
+        variants = build_variants(name) if name else {}
+    # Пока строили копии, файл могли заменить — тогда результат уже не нужен
+    updated = model.objects.filter(pk=pk, **{image_field: name}).update(**{variants_field: variants})
+    if not updated:
+        if built:
+            delete_variants(variants)
+        return False
+    invalidate_pages(*page_groups(obj))
+    return True
+
+
+def refresh_content_image(name, force=False):
+    """
+    Копии для картинки из текста поста. Посты, сохранённые раньше, чем копии
+    были готовы, находит и пересобирает build_image_variants
+    """
+    from .models import ContentImage
+
+    image, _ = ContentImage.objects.get_or_create(name=name)
+    if not force and image.variants.get("source") == name:
+        if has_metadata(image.variants):
+            return False
+        image.variants = {**image.variants, **read_metadata(name)}
+    else:
+        image.variants = build_variants(name)
+    image.save(update_fields=["variants"])
+    return True
+
+
+# =============== Фоновая очередь ===============
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="image-variants")
+        return _executor
+
+
+def _run(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception("Не удалось построить копии изображения: %s%s", func.__name__, args)
+    finally:
+        connection.close()
+
+
+def schedule(func, *args):
+    """Выполняет func(*args) после коммита — в пуле потоков или сразу (IMAGE_VARIANTS_ASYNC=False)"""
+    if ASYNC:
+        transaction.on_commit(lambda: _get_executor().submit(_run, func, *args))
+    else:
+        transaction.on_commit(lambda: func(*args))
+
+
+# =============== Картинки в HTML контента ===============
+IMG_RE = re.compile(r'<img\b([^>]*?)\bsrc="([^"]+)"([^>]*)>')
+
+
+def media_name(url):
+    """Имя файла в хранилище по его URL или None, если URL не из MEDIA_URL"""
+    if url.startswith(settings.MEDIA_URL):
+        return url[len(settings.MEDIA_URL):].lstrip("/")
+    return None
+
+
+def add_picture_sources(html):
+    """Оборачивает картинки с готовыми копиями в <picture> с srcset"""
+    from .models import ContentImage
+
+    names = {media_name(src) for _, src, _ in IMG_RE.findall(html)} - {None}
+    if not names:
+        return html
+    known = dict(ContentImage.objects.filter(name__in=names).values_list("name", "variants"))
+
+    def replace(match):
+        variants = known.get(media_name(match.group(2)))
+        sources = picture_sources(variants)
+        if not sources:
+            return match.group(0)
+        tags = "".join(
+            f'<source type="{mime}" srcset="{escape(value)}" sizes="{CONTENT_SIZES}">'
+            for mime, value in sources
+        )
+        attrs = f' width="{variants["width"]}" height="{variants["height"]}"' if variants.get("width") else ""
+        if variants.get("color"):
+            attrs += f' style="background-color: {variants["color"]}"'
+        img = f'<img{match.group(1)}src="{match.group(2)}"{match.group(3).rstrip("/")}{attrs} loading="lazy">'
+        return f"<picture>{tags}{img}</picture>"
+
+    return IMG_RE.sub(replace, html)
@@ -0,0 +1,121 @@
+# blog/location_tree.py
+"""
+Снимок всего дерева локаций в памяти процесса.
+
+Локации меняются редко, а читаются на каждой странице (URL постов, хлебные крошки,
+подлокации, sitemap). Каждый воркер gunicorn загружает дерево одним запросом и держит
+его, пока не сменится версия в общем кэше. Версию меняет любое сохранение,
+удаление или перемещение локации (см. blog/signals.py и Location.move).
+"""
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .metrics import cache_result
+
+VERSION_CACHE_KEY = "blog:location_tree:version"
+
+# Как часто (в секундах) воркер сверяет версию с общим кэшем
+CHECK_INTERVAL = getattr(settings, "LOCATION_TREE_CHECK_INTERVAL", 1.0)
+
+
+class LocationTree:
+    def __init__(self, version, nodes):
+        self.version = version
+        self.by_id = {}
+        self.by_slug_path = {}
+        self._by_tree_path = {}
+        self._children = defaultdict(list)
+        self._descendants = defaultdict(list)
+        self.roots = []
+
+        # nodes отсортированы по path — родитель всегда раньше детей
+        for node in nodes:
+            self.by_id[node.pk] = node
+            self.by_slug_path[node.slug_path] = node
+            self._by_tree_path[node.path] = node
+            parent = self._by_tree_path.get(node.path[:-node.steplen])
+            if parent is None:
+                self.roots.append(node)
+            else:
+                self._children[parent.pk].append(node)
+            for ancestor in self._iter_ancestors(node):
+                self._descendants[ancestor.pk].append(node)
+
+    @classmethod
+    def build(cls, version):
+        from .models import Location
+        return cls(version, list(Location.objects.order_by("path")))
+
+    def _iter_ancestors(self, node):
+        for end in range(node.steplen, len(node.path), node.steplen):
+            ancestor = self._by_tree_path.get(node.path[:end])
+            if ancestor is not None:
+                yield ancestor
+
+    def get(self, pk):
+        return self.by_id.get(pk)
+
+    def get_by_slug_path(self, slug_path):
+        return self.by_slug_path.get(slug_path)
+
+    def ancestors(self, pk):
+        """Предки от корня к родителю (без самой локации)"""
+        node = self.by_id.get(pk)
+        return list(self._iter_ancestors(node)) if node else []
+
+    def children(self, pk):
+        return list(self._children.get(pk, ()))
+
+    def descendants(self, pk):
+        return list(self._descendants.get(pk, ()))
+
+    def descendant_ids(self, pk, include_self=True):
+        ids = [node.pk for node in self._descendants.get(pk, ())]
+        if include_self:
+            ids.append(pk)
+        return ids
+
+    def all(self):
+        return list(self._by_tree_path.values())
+
+
+_tree = None
+_checked_at = 0.0
+
+
+def get_location_tree():
+    """Возвращает актуальный снимок дерева, при смене версии перестраивает его"""
+    global _tree, _checked_at
+    now = time.monotonic()
+    if _tree is not None and now - _checked_at < CHECK_INTERVAL:
+        return _tree
+
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        version = time.time_ns()
+        cache.add(VERSION_CACHE_KEY, version, timeout=None)
+        version = cache.get(VERSION_CACHE_KEY, version)
+    stale = _tree is None or _tree.version != version
+    if stale:
+        _tree = LocationTree.build(version)
+    cache_result("location_tree", not stale)
+    _checked_at = now
+    return _tree
+
+
+def _bump_version():
+    global _tree
+    cache.set(VERSION_CACHE_KEY, time.time_ns(), timeout=None)
+    _tree = None
+
+
+def invalidate_location_tree():
+    """Сбрасывает снимок во всех воркерах после коммита текущей транзакции"""
+    global _tree
+    # Текущий процесс видит свои незакоммиченные изменения — сбрасываем сразу
+    _tree = None
+    transaction.on_commit(_bump_version)
@@ -0,0 +1,254 @@
+# blog/management/commands/benchmark_views.py
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+from datetime import datetime
+
+import django
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from blog.models import BlogPost, Location, Tag, visible_posts_q
+from blog.page_cache import PAGE_CACHE_ALIAS
+from blog.performance import QueryTimer
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(values, pct):
+    """Перцентиль по ближайшему рангу (values отсортированы)"""
+    if not values:
+        return None
+    rank = max(1, round(pct / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет публичные страницы через тестовый клиент Django: перцентили времени ответа, "
+        "число и время SQL-запросов, размер HTML. Результат пишется в JSON; --compare сравнивает "
+        "два прогона и падает при регрессии. Данные — generate_benchmark_data"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=30, help="Запросов на страницу (по умолчанию 30)")
+        parser.add_argument("--warmup", type=int, default=3, help="Незамеряемых запросов перед замером")
+        parser.add_argument(
+            "--samples",
+            type=int,
+            default=20,
+            help="Сколько разных постов, локаций и тегов перебирать (по умолчанию 20)",
+        )
+        parser.add_argument("--seed", type=int, default=42, help="Зерно выбора постов, локаций и тегов")
+        parser.add_argument(
+            "--cache",
+            choices=("cold", "warm"),
+            default="cold",
+            help="cold — кэш страниц очищается перед каждым запросом (замер кода вьюх), warm — как у читателей",
+        )
+        parser.add_argument("--only", nargs="+", metavar="NAME", help="Замерить только эти страницы")
+        parser.add_argument("--output", help="Куда записать JSON (по умолчанию benchmarks/<дата>-<коммит>.json)")
+        parser.add_argument(
+            "--compare",
+            nargs=2,
+            metavar=("BASE", "NEW"),
+            help="Не замерять, а сравнить два JSON-файла",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.15,
+            help="Допустимый рост p50/p95 и размера ответа при сравнении (по умолчанию 0.15 = 15%%)",
+        )
+
+    def handle(self, *args, **options):
+        if options["compare"]:
+            return self._compare(*options["compare"], threshold=options["threshold"])
+
+        endpoints = self._endpoints(random.Random(options["seed"]), options["samples"])
+        if options["only"]:
+            unknown = set(options["only"]) - endpoints.keys()
+            if unknown:
+                raise CommandError(f"Неизвестные страницы: {', '.join(sorted(unknown))}")
+            endpoints = {name: urls for name, urls in endpoints.items() if name in options["only"]}
+
+        self.stdout.write(f"⏱  БД: {connection.vendor}, кэш страниц: {options['cache']}, запросов на страницу: "
+                          f"{options['requests']}")
+        results = {}
+        # Тестовому клиенту нужен хост testserver, которого нет в боевом ALLOWED_HOSTS
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            for name, urls in endpoints.items():
+                results[name] = self._measure(urls, options)
+                self._print_result(name, results[name])
+
+        report = {
+            "meta": self._meta(options),
+            "results": results,
+        }
+        output = options["output"] or os.path.join(
+            settings.BASE_DIR, "benchmarks", f"{datetime.now():%Y%m%d-%H%M%S}-{report['meta']['commit'] or 'nogit'}.json"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"✅ Результат: {output}"))
+
+    # =============== Страницы ===============
+    @staticmethod
+    def _endpoints(rng, samples):
+        """{имя: [URL, ...]} — посты, локации и теги выбираются детерминированно"""
+        visible = BlogPost.objects.visible()
+
+        def sample(ids):
+            ids = sorted(ids)
+            return rng.sample(ids, min(samples, len(ids)))
+
+        post_ids = sample(visible.values_list("pk", flat=True))
+        posts = BlogPost.objects.filter(pk__in=post_ids).select_related("location")
+        has_posts = Exists(visible.filter(location=OuterRef("pk")))
+        locations = Location.objects.filter(pk__in=sample(
+            Location.objects.filter(has_posts).values_list("pk", flat=True)
+        ))
+        tags = Tag.objects.filter(pk__in=sample(
+            Tag.objects.filter(visible_posts_q("posts__")).values_list("pk", flat=True).distinct()
+        ))
+        pages = max(1, visible.count() // 10)
+
+        endpoints = {
+            "home": [reverse("blog:home")],
+            "home_deep_page": [f"{reverse('blog:home')}?page={max(1, pages // 2)}"],
+            "post_detail": [post.get_absolute_url() for post in posts],
+            "location_detail": [location.get_absolute_url() for location in locations],
+            "tag_list": [reverse("blog:tag_list")],
+            "tag_detail": [tag.get_absolute_url() for tag in tags],
+            "best_posts": [reverse("blog:best_posts")],
+            "popular_posts": [reverse("blog:popular_posts")],
+            "sitemap_index": [reverse("sitemap_index")],
+            "sitemap_posts": [reverse("sitemap_section", args=["posts"])],
+        }
+        return {name: urls for name, urls in endpoints.items() if urls}
+
+    # =============== Замер ===============
+    def _measure(self, urls, options):
+        client = Client()
+        pages_cache = caches[PAGE_CACHE_ALIAS]
+        cold = options["cache"] == "cold"
+        timings, query_counts, query_times, sizes, statuses = [], [], [], [], set()
+
+        for number in range(options["warmup"] + options["requests"]):
+            url = urls[number % len(urls)]
+            if cold:
+                pages_cache.clear()
+            with QueryTimer() as queries:
+                started = time.perf_counter()
+                response = client.get(url)
+                content = b"".join(response) if response.streaming else response.content
+                elapsed = time.perf_counter() - started
+            if number < options["warmup"]:
+                continue
+            statuses.add(response.status_code)
+            timings.append(elapsed * 1000)
+            query_counts.append(len(queries))
+            query_times.append(queries.ms)
+            sizes.append(len(content))
+
+        timings.sort()
+        return {
+            "urls": urls,
+            "requests": len(timings),
+            "status": sorted(statuses),
+            "latency_ms": {
+                **{f"p{pct}": round(percentile(timings, pct), 2) for pct in PERCENTILES},
+                "mean": round(sum(timings) / len(timings), 2),
+                "max": round(timings[-1], 2),
+            },
+            "queries": {"median": percentile(sorted(query_counts), 50), "max": max(query_counts)},
+            "query_ms": {"median": round(percentile(sorted(query_times), 50), 2), "max": round(max(query_times), 2)},
+            "bytes": {"median": percentile(sorted(sizes), 50), "max": max(sizes)},
+        }
+
+    def _print_result(self, name, result):
+        latency = result["latency_ms"]
+        line = (
+            f"{name:<18} p50 {latency['p50']:>8.2f} мс  p95 {latency['p95']:>8.2f} мс  "
+            f"запросов {result['queries']['median']:>3} ({result['query_ms']['median']:.2f} мс)  "
+            f"{result['bytes']['median'] / 1024:>7.1f} КБ"
+        )
+        if result["status"] != [200]:
+            self.stdout.write(self.style.WARNING(f"{line}  статусы {result['status']}"))
+        else:
+            self.stdout.write(line)
+
+    @staticmethod
+    def _meta(options):
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "commit": commit,
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "cache": options["cache"],
+            "requests": options["requests"],
+            "seed": options["seed"],
+            "dataset": {
+                "posts": BlogPost.objects.count(),
+                "visible_posts": BlogPost.objects.visible().count(),
+                "locations": Location.objects.count(),
+                "tags": Tag.objects.count(),
+            },
+        }
+
+    # =============== Сравнение ===============
+    def _compare(self, base_path, new_path, threshold):
+        reports = []
+        for path in (base_path, new_path):
+            with open(path, encoding="utf-8") as file:
+                reports.append(json.load(file))
+        base, new = reports
+        if base["meta"].get("dataset") != new["meta"].get("dataset"):
+            self.stdout.write(self.style.WARNING("⚠️ Прогоны сделаны на разных данных — сравнение приблизительное"))
+
+        regressions = []
+        for name in sorted(base["results"].keys() & new["results"].keys()):
+            old, current = base["results"][name], new["results"][name]
+            problems = []
+            for metric in ("p50", "p95"):
+                before, after = old["latency_ms"][metric], current["latency_ms"][metric]
+                # Доли миллисекунды — шум, а не регрессия
+                if after > before * (1 + threshold) and after - before > 1:
+                    problems.append(f"{metric} {before:.2f} → {after:.2f} мс")
+            if current["queries"]["max"] > old["queries"]["max"]:
+                problems.append(f"запросов {old['queries']['max']} → {current['queries']['max']}")
+            if current["bytes"]["median"] > old["bytes"]["median"] * (1 + threshold):
+                problems.append(f"размер {old['bytes']['median']} → {current['bytes']['median']} Б")
+
+            change = (current["latency_ms"]["p50"] - old["latency_ms"]["p50"]) / (old["latency_ms"]["p50"] or 1)
+            line = (
+                f"{name:<18} p50 {old['latency_ms']['p50']:>8.2f} → {current['latency_ms']['p50']:>8.2f} мс "
+                f"({change:+.0%})  запросов {old['queries']['median']} → {current['queries']['median']}"
+            )
+            if problems:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(f"{line}  ❌ {'; '.join(problems)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(line) if change < -threshold else line)
+
+        if regressions:
+            raise CommandError(f"Регрессии: {', '.join(regressions)}")
+        self.stdout.write(self.style.SUCCESS("✅ Регрессий нет"))
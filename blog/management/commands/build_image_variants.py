@@ -0,0 +1,109 @@
+# blog/management/commands/build_image_variants.py
+import re
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from blog.image_variants import image_fields, media_name, refresh_content_image, refresh_object_variants
+from blog.models import AboutPage, BlogPost, ContentImage
+from blog.page_cache import invalidate_pages
+
+
+class Command(BaseCommand):
+    help = (
+        "Строит AVIF/WebP-копии для srcset и метаданные (размеры, цвет, заглушка) у существующих "
+        "обложек, галерей и картинок в тексте. Если копии уже есть, дочитываются только метаданные"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Пересобрать копии и метаданные, даже если они уже есть",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Сколько изображений обрабатывать параллельно (по умолчанию 4)",
+        )
+
+    def handle(self, *args, **options):
+        force = options["force"]
+        jobs = []
+        for model, (image_field, _, _) in image_fields().items():
+            pks = model.objects.exclude(**{image_field: ""}).exclude(
+                **{f"{image_field}__isnull": True}
+            ).values_list("pk", flat=True)
+            jobs += [(refresh_object_variants, model, pk) for pk in pks]
+        references = self._content_images()
+        for name in sorted(references):
+            jobs.append((refresh_content_image, name))
+
+        self.stdout.write(f"🖼  Изображений к проверке: {len(jobs)}")
+        built = failed = 0
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            futures = {pool.submit(self._run, func, *args, force=force): args for func, *args in jobs}
+            for future in as_completed(futures):
+                try:
+                    built += future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f"Ошибка {futures[future]}: {e}"))
+
+        self._mark_stale_content(references)
+        call_command("render_markdown", stdout=self.stdout)
+        style = self.style.WARNING if failed else self.style.SUCCESS
+        self.stdout.write(style(f"✅ Построено: {built}, ошибок: {failed}"))
+
+    @staticmethod
+    def _run(func, *args, force):
+        try:
+            return bool(func(*args, force=force))
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _content_images():
+        """
+        {имя файла из MEDIA_URL: [(модель, pk, slug, content_html)]} — на что ссылается
+        Markdown постов и страницы «О нас»
+        """
+        pattern = re.compile(re.escape(settings.MEDIA_URL) + r'[^\s)"\']+\.(?:jpe?g|png|gif|webp)', re.IGNORECASE)
+        references = defaultdict(list)
+        for model in (BlogPost, AboutPage):
+            queryset = model.objects.filter(content_markdown__contains=settings.MEDIA_URL)
+            fields = ("pk", "slug" if model is BlogPost else "pk", "content_markdown", "content_html")
+            for pk, slug, text, html in queryset.values_list(*fields).iterator():
+                for name in {media_name(url) for url in pattern.findall(text)}:
+                    references[name].append((model, pk, slug, html))
+        return references
+
+    def _mark_stale_content(self, references):
+        """
+        Помечает устаревшим HTML, в котором нет копий уже готовых картинок: копии
+        только что построены или пост сохранили раньше, чем они были готовы
+        """
+        # Имя любой копии: копии не переезжают вместе с исходником (fix_markdown_image_paths)
+        ready = {}
+        for image in ContentImage.objects.filter(name__in=references).only("name", "variants"):
+            entries = [entry for entry in (image.variants.get("formats") or {}).values() if entry]
+            if entries:
+                ready[image.name] = entries[0][0][1]
+        stale = defaultdict(set)
+        groups = set()
+        for name, variant in ready.items():
+            for model, pk, slug, html in references[name]:
+                if variant not in html:
+                    stale[model].add(pk)
+                    groups.add(f"post:{slug}" if model is BlogPost else "about")
+        for model, pks in stale.items():
+            # update() мимо сигналов — кэш страниц сбрасываем сами
+            model.objects.filter(pk__in=pks).update(content_renderer_version=0)
+        invalidate_pages(*groups)
+        if stale:
+            self.stdout.write(f"📝 HTML без копий картинок: {sum(map(len, stale.values()))}")
@@ -0,0 +1,27 @@
+# blog/management/commands/build_related_posts.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.page_cache import invalidate_pages
+from blog.related_posts import rebuild_related_posts
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает таблицу похожих постов (теги, близость локаций, текст)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--top",
+            type=int,
+            default=6,
+            help="Сколько похожих постов хранить для каждого поста (по умолчанию 6)",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        written = rebuild_related_posts(top_n=options["top"])
+        invalidate_pages('related')
+        self.stdout.write(
+            self.style.SUCCESS(f"✅ Записано пар: {written} за {time.monotonic() - started:.1f} с")
+        )
@@ -0,0 +1,44 @@
+# blog/management/commands/explain_post_queries.py
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+
+from blog.models import BlogPost
+
+
+class Command(BaseCommand):
+    help = "Печатает планы запросов лент видимых постов для текущей БД (SQLite или PostgreSQL)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--analyze",
+            action="store_true",
+            help="Выполнить запросы и показать фактическое время (EXPLAIN ANALYZE, только PostgreSQL)",
+        )
+
+    def handle(self, *args, **options):
+        explain_options = {}
+        if options["analyze"] and connection.vendor == "postgresql":
+            explain_options = {"analyze": True, "buffers": True}
+
+        visible = BlogPost.objects.visible()
+        queries = {
+            "Лента (первая страница)": visible.order_by("-published_at", "-pk")[:11],
+            "Sitemap постов": visible.only("slug", "location_id", "updated_at").order_by("-published_at", "-pk"),
+        }
+        anchor = visible.order_by("-published_at", "-pk").values("published_at", "pk").first()
+        if anchor:
+            # То же условие, что строит KeysetPaginationMixin для ?after=
+            queries["Лента (keyset, ?after=)"] = visible.filter(
+                Q(published_at__lt=anchor["published_at"])
+                | Q(published_at=anchor["published_at"], pk__lt=anchor["pk"])
+            ).order_by("-published_at", "-pk")[:11]
+
+        self.stdout.write(f"📊 БД: {connection.vendor}")
+        for title, queryset in queries.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n{title}"))
+            self.stdout.write(queryset.explain(**explain_options))
+        self.stdout.write(
+            "\nОжидается поиск по индексу blogpost_visible_idx без отдельной сортировки "
+            "(SQLite: USING INDEX blogpost_visible_idx, PostgreSQL: Index Scan using blogpost_visible_idx)."
+        )
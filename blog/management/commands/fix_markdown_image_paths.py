@@ -1,119 +1,256 @@
 # blog/management/commands/fix_markdown_image_paths.py
-import re
+import json
 import os
-from urllib.parse import urlparse
-from django.core.management.base import BaseCommand
+import re
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
 from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
-from blog.models import BlogPost, AboutPage
-from kazan import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog.image_variants import media_name
+from blog.models import BlogPost, AboutPage, ContentImage
+
+MARKDOWN_IMG_PATTERN = re.compile(r'!\[([^\]]*)\]\(([^)]*markdown-images/[^)]+)\)')
+HTML_IMG_PATTERN = re.compile(r'<img[^>]*src="([^"]*markdown-images/[^"]+)"[^>]*>')
+
 
 class Command(BaseCommand):
-    help = 'Перемещает markdown-изображения в структурированные папки и обновляет ссылки в content_markdown'
+    help = (
+        'Перемещает markdown-изображения в структурированные папки и обновляет ссылки в content_markdown. '
+        'Файлы копируются параллельно (на S3 — без скачивания), прогресс пишется в манифест, '
+        'прерванный запуск продолжается с места остановки.'
+    )
 
-    def handle(self, *args, **options):
-        updated_count = 0
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет перемещено (манифест с планом всё равно пишется)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Сколько файлов копировать одновременно (по умолчанию 8)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Сколько записей сохранять в одной транзакции (по умолчанию 50)',
+        )
+        parser.add_argument(
+            '--manifest',
+            default=os.path.join(settings.BASE_DIR, 'fix_markdown_image_paths.jsonl'),
+            help='Файл манифеста: по строке JSON на каждый файл (old, new, status)',
+        )
 
-        # Обработка BlogPost
-        posts_with_md_images = BlogPost.objects.filter(
-            content_markdown__contains='markdown-images/'
-        ).select_related('location', 'author')
-        updated_count += self._process_posts(posts_with_md_images, is_about=False)
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.storage = default_storage
+        self.manifest_path = options['manifest']
+        self.done = self._read_manifest()
+        self.manifest_lock = threading.Lock()
 
-        # Обработка AboutPage
-        about_pages_with_md_images = AboutPage.objects.filter(
-            content_markdown__contains='markdown-images/'
+        plan = self._plan()
+        moves = {old: new for _, changes, _ in plan for old, new in changes.items()}
+        self.stdout.write(
+            f"📋 Записей к обновлению: {len(plan)}, файлов: {len(moves)} "
+            f"(уже скопировано ранее: {sum(1 for old in moves if self.done.get(old) == 'copied')})"
         )
-        updated_count += self._process_posts(about_pages_with_md_images, is_about=True)
+
+        if self.dry_run:
+            for old, new in moves.items():
+                self.stdout.write(f"  {old} → {new}")
+                self._record(old, new, 'planned')
+            self.stdout.write(self.style.SUCCESS(f"Пробный запуск. План записан в {self.manifest_path}"))
+            return
+
+        self.copier = self._server_side_copy if hasattr(self.storage, 'bucket') else self._stream_copy
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            copied = self._copy_all(pool, moves)
+            updated = self._update_records(pool, plan, copied, options['batch_size'])
 
         self.stdout.write(
-            self.style.SUCCESS(f"Завершено. Обновлено записей: {updated_count}")
+            self.style.SUCCESS(f"Завершено. Обновлено записей: {updated}, перемещено файлов: {len(copied)}")
         )
 
-    def _process_posts(self, queryset, is_about=False):
-        updated_count = 0
-        # Регулярные выражения
-        markdown_img_pattern = re.compile(r'!\[([^\]]*)\]\(([^)]*markdown-images/[^)]+)\)')
-        html_img_pattern = re.compile(r'<img[^>]*src="([^"]*markdown-images/[^"]+)"[^>]*>')
-
-        for obj in queryset:
-            original_content = obj.content_markdown
-            new_content = original_content
-            has_changes = False
-
-            # 1. Markdown-синтаксис
-            for match in markdown_img_pattern.finditer(original_content):
-                old_url = match.group(2)
-                if not self._is_valid_url(old_url):
-                    continue
-                new_url = self._move_image(obj, old_url, is_about)
-                if new_url:
-                    new_content = new_content.replace(old_url, new_url)
-                    has_changes = True
-
-            # 2. HTML-теги
-            for match in html_img_pattern.finditer(original_content):
-                old_url = match.group(1)
-                if not self._is_valid_url(old_url):
-                    continue
-                new_url = self._move_image(obj, old_url, is_about)
-                if new_url:
-                    new_content = new_content.replace(old_url, new_url)
-                    has_changes = True
-
-            if has_changes:
-                obj.content_markdown = new_content
-                obj.save(update_fields=['content_markdown'])
-                updated_count += 1
-                model_name = "AboutPage" if is_about else "BlogPost"
-                self.stdout.write(f"✅ Обновлён {model_name}: {obj.title if hasattr(obj, 'title') else obj.pk}")
-
-        return updated_count
-
-    def _is_valid_url(self, url):
-        """Проверяет, что URL содержит markdown-images/"""
-        return url and 'markdown-images/' in url
-
-    def _move_image(self, obj, old_url, is_about=False):
-        try:
-            if not old_url.startswith(settings.MEDIA_URL):
-                self.stdout.write(self.style.WARNING(f"URL не начинается с MEDIA_URL: {old_url}"))
-                return None
-
-            old_name = old_url[len(settings.MEDIA_URL):].lstrip('/')
-            if not old_name.startswith('markdown-images/'):
-                return None
-
-            filename = os.path.basename(old_name)
-            ext = filename.split('.')[-1]
-
-            if is_about:
-                # Для AboutPage: about_images/{id}/internal_picture.{ext}
-                if not obj.pk:
-                    self.stdout.write(self.style.WARNING("AboutPage без pk — пропуск"))
-                    return None
-                new_name = f"about_images/{obj.pk}/internal_picture.{ext}"
-            else:
-                # Для BlogPost: post_images/{location_path}/{slug}/internal_picture.{ext}
-                if not obj.location or not obj.slug:
-                    self.stdout.write(self.style.WARNING(f"BlogPost без location или slug: {obj.title}"))
-                    return None
-                location_path = obj.location.get_path_slug()
-                new_name = f"post_images/{location_path}/{obj.slug}/internal_picture.{ext}"
-
-            if not default_storage.exists(old_name):
-                self.stdout.write(self.style.WARNING(f"Файл не найден: {old_name}"))
-                return None
-
-            with default_storage.open(old_name, 'rb') as f:
-                file_content = f.read()
-
-            new_full_name = default_storage.save(new_name, ContentFile(file_content))
-            default_storage.delete(old_name)
-
-            new_url = default_storage.url(new_full_name)
-            return new_url
-
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f"Ошибка при перемещении {old_url}: {e}"))
-            return None
\ No newline at end of file
+    # =============== План ===============
+    def _plan(self):
+        """
+        [(объект, {старое имя: новое имя}, {URL из текста: старое имя})] для записей
+        со ссылками на markdown-images/
+        """
+        plan = []
+        targets = {}  # картинка из нескольких записей переезжает один раз — к первой из них
+        self.kept = set()  # файлы, ссылки на которые останутся (записи без location/slug)
+        querysets = (
+            (BlogPost.objects.filter(content_markdown__contains='markdown-images/').select_related('location'), False),
+            (AboutPage.objects.filter(content_markdown__contains='markdown-images/'), True),
+        )
+        for queryset, is_about in querysets:
+            for obj in queryset.iterator(chunk_size=200):
+                changes, links = {}, {}
+                urls = [m.group(2) for m in MARKDOWN_IMG_PATTERN.finditer(obj.content_markdown)]
+                urls += [m.group(1) for m in HTML_IMG_PATTERN.finditer(obj.content_markdown)]
+                for url in urls:
+                    old_name = self._media_name(url)
+                    if old_name is None:
+                        continue
+                    new_name = targets.get(old_name) or self._target_name(obj, old_name, is_about)
+                    if new_name:
+                        changes[old_name] = targets[old_name] = new_name
+                        # Заменяется ровно найденный в тексте URL, а не собранный заново storage.url()
+                        links[url] = old_name
+                    else:
+                        self.kept.add(old_name)
+                if changes:
+                    plan.append((obj, changes, links))
+        return plan
+
+    def _media_name(self, url):
+        name = media_name(url)
+        if name is None:
+            self.stdout.write(self.style.WARNING(f"URL не начинается с MEDIA_URL: {url}"))
+            return None
+        return name if name.startswith('markdown-images/') else None
+
+    def _target_name(self, obj, old_name, is_about):
+        # Имя зависит только от исходного (uuid от markdownx) — повторный запуск попадёт в тот же файл
+        stem, ext = os.path.splitext(os.path.basename(old_name))
+        filename = f"internal_picture_{stem}{ext}"
+        if is_about:
+            # Для AboutPage: about_images/{id}/internal_picture_*.{ext}
+            return f"about_images/{obj.pk}/{filename}"
+        # Для BlogPost: post_images/{location_path}/{slug}/internal_picture_*.{ext}
+        if not obj.location or not obj.slug:
+            self.stdout.write(self.style.WARNING(f"BlogPost без location или slug: {obj.title}"))
+            return None
+        return f"post_images/{obj.location.get_path_slug()}/{obj.slug}/{filename}"
+
+    # =============== Копирование ===============
+    def _copy_all(self, pool, moves):
+        """Копирует файлы в пуле потоков, возвращает множество успешно скопированных старых имён"""
+        copied = {old for old in moves if self.done.get(old) in ('copied', 'done')}
+        futures = {
+            pool.submit(self._copy_one, old, new): old
+            for old, new in moves.items() if old not in copied
+        }
+        for number, future in enumerate(as_completed(futures), start=1):
+            old = futures[future]
+            try:
+                if future.result():
+                    copied.add(old)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"Ошибка при копировании {old}: {e}"))
+            if number % 100 == 0:
+                self.stdout.write(f"  скопировано {number} из {len(futures)}")
+        return copied
+
+    def _copy_one(self, old, new):
+        if self.storage.exists(new):
+            pass  # скопирован в прерванном запуске, манифест не успел записаться
+        elif not self.storage.exists(old):
+            self.stdout.write(self.style.WARNING(f"Файл не найден: {old}"))
+            return False
+        else:
+            self.copier(old, new)
+        self._record(old, new, 'copied')
+        return True
+
+    def _server_side_copy(self, old, new):
+        """S3-совместимое хранилище: копия внутри бакета (управляемый multipart для больших файлов)"""
+        bucket = self.storage.bucket
+        bucket.copy(
+            {'Bucket': bucket.name, 'Key': self.storage._normalize_name(old)},
+            self.storage._normalize_name(new),
+        )
+
+    def _stream_copy(self, old, new):
+        """Прочие хранилища: потоковое копирование без чтения файла в память целиком"""
+        with self.storage.open(old, 'rb') as source:
+            saved = self.storage.save(new, source)
+        if saved != new:
+            raise RuntimeError(f"хранилище сохранило файл как {saved}")
+
+    # =============== Обновление записей ===============
+    def _update_records(self, pool, plan, copied, batch_size):
+        ready = [entry for entry in plan if set(entry[1]) <= copied]
+        skipped = len(plan) - len(ready)
+        if skipped:
+            self.stdout.write(self.style.WARNING(f"Пропущено записей с нескопированными файлами: {skipped}"))
+
+        # Старый файл удаляется, только когда обновлены все ссылающиеся на него записи.
+        # Пропущенные записи и ссылки, которые не удалось заменить, держат файл на месте
+        pending = Counter(old for _, changes, _ in ready for old in changes)
+        kept = set(self.kept)
+        for _, changes, _ in plan:
+            if not set(changes) <= copied:
+                kept.update(changes)
+
+        updated = 0
+        for start in range(0, len(ready), batch_size):
+            batch = ready[start:start + batch_size]
+            with transaction.atomic():
+                for obj, changes, links in batch:
+                    self._move_content_images(changes)
+                    for url, old in links.items():
+                        obj.content_markdown = obj.content_markdown.replace(url, self.storage.url(changes[old]))
+                    obj.save(update_fields=['content_markdown'])
+                    for old in changes:
+                        pending[old] -= 1
+                        if old in obj.content_markdown:
+                            kept.add(old)
+                    model_name = "AboutPage" if isinstance(obj, AboutPage) else "BlogPost"
+                    self.stdout.write(f"✅ Обновлён {model_name}: {obj.title if hasattr(obj, 'title') else obj.pk}")
+            updated += len(batch)
+
+            # Ссылки обновлены и закоммичены — старые файлы, на которые больше никто не ссылается, не нужны
+            moved = {
+                old: new for _, changes, _ in batch for old, new in changes.items()
+                if pending[old] == 0 and old not in kept
+            }
+            for future in as_completed([pool.submit(self._delete_old, old, new) for old, new in moved.items()]):
+                future.result()
+
+        kept &= copied
+        if kept:
+            self.stdout.write(self.style.WARNING(
+                f"Оставлено старых файлов, на которые ещё есть ссылки: {len(kept)}"
+            ))
+            for old in sorted(kept):
+                self._record(old, None, 'kept')
+        return updated
+
+    @staticmethod
+    def _move_content_images(changes):
+        """Копии для srcset (blog/image_variants.py) остаются на месте — переносим только запись о них"""
+        for image in ContentImage.objects.filter(name__in=changes):
+            image.name = changes[image.name]
+            if image.variants:
+                image.variants['source'] = image.name
+            image.save(update_fields=['name', 'variants'])
+
+    def _delete_old(self, old, new):
+        self.storage.delete(old)
+        self._record(old, new, 'done')
+
+    # =============== Манифест ===============
+    def _read_manifest(self):
+        """{старое имя: последний статус} из прошлых запусков"""
+        done = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding='utf-8') as manifest:
+                for line in manifest:
+                    if line.strip():
+                        entry = json.loads(line)
+                        done[entry['old']] = entry['status']
+        return done
+
+    def _record(self, old, new, status):
+        with self.manifest_lock, open(self.manifest_path, 'a', encoding='utf-8') as manifest:
+            manifest.write(json.dumps({'old': old, 'new': new, 'status': status}, ensure_ascii=False) + '\n')
@@ -0,0 +1,20 @@
+# blog/management/commands/flush_post_views.py
+from django.core.management.base import BaseCommand
+
+from blog.view_counter import flush_post_views, pending_views_count
+
+
+class Command(BaseCommand):
+    help = "Записывает накопленные в очереди просмотры в БД (обычно это делают сами воркеры)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Забрать и текущие, ещё не закрытые интервалы очереди",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"В очереди просмотров: {pending_views_count()}")
+        counted = flush_post_views(include_open=options["all"])
+        self.stdout.write(self.style.SUCCESS(f"Завершено. Засчитано просмотров: {counted}"))
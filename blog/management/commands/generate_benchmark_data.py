@@ -0,0 +1,291 @@
+# blog/management/commands/generate_benchmark_data.py
+import io
+import ipaddress
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from blog.location_tree import invalidate_location_tree
+from blog.models import BlogPost, Location, PostRating, PostView, Tag
+from blog.page_cache import invalidate_pages
+from blog.utils import MARKDOWN_RENDERER_VERSION, html_to_excerpt, markdown_content_hash, markdownify_with_video
+
+User = get_user_model()
+
+PREFIX = "bench"
+
+WORDS = (
+    "путешествие маршрут крепость собор набережная музей усадьба монастырь озеро река берег "
+    "пристань площадь улица парк заповедник тропа смотровая площадка мечеть церковь кремль "
+    "башня мост вокзал рынок кухня чак-чак эчпочмак гостиница экскурсия выходные поезд "
+    "автобус теплоход зима лето осень весна закат рассвет история купцы архитектура модерн "
+    "деревянный каменный древний старинный уютный красивый тихий шумный главный местный"
+).split()
+REGION_NAMES = "Северный Южный Западный Восточный Верхний Нижний Приволжский Заречный Лесной Степной".split()
+KINDS = ("Страна", "Регион", "Город", "Место")
+
+
+class Command(BaseCommand):
+    help = (
+        "Создаёт воспроизводимый набор данных для нагрузочных замеров: дерево локаций "
+        "страна/регион/город/место, теги, посты с Markdown (Rutube, картинки), просмотры и оценки. "
+        "Всё пишется через bulk_create, сигналы не срабатывают. Запускать на отдельной БД"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=42, help="Зерно генератора (по умолчанию 42)")
+        parser.add_argument("--posts", type=int, default=100_000, help="Число постов (по умолчанию 100 000)")
+        parser.add_argument("--tags", type=int, default=3_000, help="Число тегов (по умолчанию 3 000)")
+        parser.add_argument(
+            "--locations",
+            default="3,12,8,10",
+            help="Ветвление дерева: стран, регионов в стране, городов в регионе, мест в городе (3,12,8,10)",
+        )
+        parser.add_argument("--views", type=int, default=3_000_000, help="Строк PostView (по умолчанию 3 млн)")
+        parser.add_argument("--ratings", type=int, default=1_000_000, help="Строк PostRating (по умолчанию 1 млн)")
+        parser.add_argument(
+            "--bodies",
+            type=int,
+            default=500,
+            help="Сколько разных текстов постов отрендерить (посты делят их между собой, по умолчанию 500)",
+        )
+        parser.add_argument("--covers", type=int, default=20, help="Сколько файлов-обложек создать (0 — без обложек)")
+        parser.add_argument("--batch-size", type=int, default=2_000, help="Постов в одной транзакции")
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Разрешить запуск при DEBUG=False",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options["force"]:
+            raise CommandError("DEBUG=False — похоже на боевую БД. Если это не так, добавьте --force")
+        if Location.objects.filter(slug__startswith=f"{PREFIX}-").exists():
+            raise CommandError("Тестовые данные уже есть в БД — генерируйте на чистой базе")
+
+        self.rng = random.Random(options["seed"])
+        self.now = timezone.now()
+        started = time.monotonic()
+
+        author, _ = User.objects.get_or_create(username="admin")
+        leaves = self._create_locations([int(n) for n in options["locations"].split(",")])
+        tag_ids = self._create_tags(options["tags"])
+        bodies = self._render_bodies(options["bodies"])
+        covers = self._create_covers(options["covers"])
+        self.stdout.write(f"🧱 Локаций: {len(leaves)} листьев, тегов: {len(tag_ids)}, текстов: {len(bodies)}")
+
+        self._create_posts(options, author, leaves, tag_ids, bodies, covers)
+
+        invalidate_location_tree()
+        invalidate_pages("posts", "tags", "locations", "related")
+        self.stdout.write(self.style.SUCCESS(f"✅ Готово за {time.monotonic() - started:.0f} с"))
+        self.stdout.write(
+            "Дальше: python manage.py rebuild_search_index && python manage.py build_related_posts"
+        )
+
+    # =============== Локации и теги ===============
+    def _create_locations(self, fanout):
+        """Дерево строится с готовыми path treebeard — без add_child на каждый узел"""
+        last_root = Location.get_last_root_node()
+        first_root = Location._str2int(last_root.path) + 1 if last_root else 1
+        leaves = []
+        level = [(None, first_root)]  # (родитель, номер первого шага)
+        for depth, count in enumerate(fanout, start=1):
+            nodes = []
+            for parent, first_step in level:
+                names = sorted(
+                    f"{KINDS[depth - 1]} {self.rng.choice(REGION_NAMES)} {number:03d}"
+                    for number in range(1, count + 1)
+                )
+                for step, name in enumerate(names, start=first_step):
+                    number = len(nodes) + 1
+                    node = Location(
+                        name=name,
+                        slug=f"{PREFIX}-{depth}-{number}",
+                        description=self._sentence(12),
+                        path=Location._get_path(parent.path if parent else "", depth, step),
+                        depth=depth,
+                        numchild=fanout[depth] if depth < len(fanout) else 0,
+                    )
+                    node._set_paths(parent)
+                    nodes.append(node)
+            Location.objects.bulk_create(nodes, batch_size=1000)
+            level = [(node, 1) for node in nodes]
+            leaves = nodes
+        return [node.pk for node in leaves]
+
+    def _create_tags(self, count):
+        tags = [
+            Tag(name=f"{self.rng.choice(WORDS)} {number}"[:50], slug=f"{PREFIX}-tag-{number}")
+            for number in range(1, count + 1)
+        ]
+        Tag.objects.bulk_create(tags, batch_size=1000)
+        return [tag.pk for tag in tags]
+
+    # =============== Тексты и обложки ===============
+    def _sentence(self, words):
+        text = " ".join(self.rng.choice(WORDS) for _ in range(words))
+        return text[0].upper() + text[1:] + "."
+
+    def _markdown(self, number):
+        parts = []
+        for section in range(self.rng.randint(3, 8)):
+            parts.append(f"## {self._sentence(4)[:-1]}")
+            parts += [" ".join(self._sentence(self.rng.randint(8, 20)) for _ in range(4)) for _ in range(3)]
+            if self.rng.random() < 0.5:
+                parts.append(
+                    f"![{self._sentence(3)[:-1]}]({settings.MEDIA_URL}markdown-images/{PREFIX}-{number}-{section}.jpg)"
+                )
+            if self.rng.random() < 0.2:
+                parts.append(f"{{{{ rutube:{self.rng.getrandbits(64):016x} }}}}")
+            if self.rng.random() < 0.3:
+                parts.append("\n".join(f"- **{self.rng.choice(WORDS)}** — {self._sentence(6)}" for _ in range(4)))
+        return "\n\n".join(parts)
+
+    def _render_bodies(self, count):
+        """Markdown рендерится один раз на текст — 100 тыс. рендеров заняли бы большую часть времени"""
+        bodies = []
+        for number in range(count):
+            markdown = self._markdown(number)
+            html = markdownify_with_video(markdown)
+            bodies.append({
+                "content_markdown": markdown,
+                "content_html": html,
+                "content_hash": markdown_content_hash(markdown),
+                "content_renderer_version": MARKDOWN_RENDERER_VERSION,
+                "excerpt": html_to_excerpt(html),
+            })
+        return bodies
+
+    def _create_covers(self, count):
+        covers = []
+        for number in range(count):
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            buffer = io.BytesIO()
+            Image.new("RGB", (1600, 1000), color).save(buffer, format="JPEG", quality=70)
+            covers.append(default_storage.save(f"{PREFIX}/cover-{number}.jpg", ContentFile(buffer.getvalue())))
+        return covers
+
+    # =============== Посты, просмотры, оценки ===============
+    def _create_posts(self, options, author, leaves, tag_ids, bodies, covers):
+        total = options["posts"]
+        views_per_post = options["views"] / max(total, 1)
+        ratings_per_post = options["ratings"] / max(total, 1)
+        # Популярность постов и тегов — по закону Ципфа: немногие собирают большую часть
+        tag_weights = list(accumulate(1 / rank for rank in range(1, len(tag_ids) + 1)))
+        popularity = [1 / rank ** 0.8 for rank in range(1, total + 1)]
+        self.rng.shuffle(popularity)
+        scale = total / sum(popularity)
+        counters = {"views": 0, "ratings": 0}
+
+        with _without_auto_now(BlogPost, "created_at", "updated_at"), _without_auto_now(PostView, "created_at"), \
+                _without_auto_now(PostRating, "created_at"):
+            for start in range(0, total, options["batch_size"]):
+                numbers = range(start, min(start + options["batch_size"], total))
+                with transaction.atomic():
+                    self._create_batch(
+                        numbers, author, leaves, tag_ids, tag_weights, bodies, covers,
+                        [popularity[n] * scale * views_per_post for n in numbers],
+                        [popularity[n] * scale * ratings_per_post for n in numbers],
+                        counters,
+                    )
+                self.stdout.write(
+                    f"  постов: {numbers[-1] + 1}, просмотров: {counters['views']}, оценок: {counters['ratings']}"
+                )
+
+    def _create_batch(self, numbers, author, leaves, tag_ids, tag_weights, bodies, covers,
+                      expected_views, expected_ratings, counters):
+        rng = self.rng
+        # Сырые просмотры — за окно хранения, как после rollup_post_views
+        window = timedelta(days=getattr(settings, "POST_VIEW_RETENTION_DAYS", 90))
+        posts, ratings, views = [], [], []
+        for number, views_expected, ratings_expected in zip(numbers, expected_views, expected_ratings):
+            published_at = self.now - timedelta(days=rng.uniform(-30, 5 * 365))
+            published = published_at < self.now
+            scores = [
+                rng.choices((1, 2, 3, 4, 5), weights=(1, 1, 3, 6, 8))[0]
+                for _ in range(round(rng.expovariate(1 / ratings_expected)) if published and ratings_expected else 0)
+            ]
+            view_count = round(rng.expovariate(1 / views_expected)) if published and views_expected else 0
+            ratings.append(scores)
+            views.append((max(published_at, self.now - window), view_count))
+            title = self._sentence(rng.randint(3, 8))[:-1]
+            posts.append(BlogPost(
+                title=title,
+                slug=f"{PREFIX}-{number + 1}",
+                author=author,
+                location_id=rng.choice(leaves),
+                cover_image=rng.choice(covers) if covers and rng.random() < 0.8 else "",
+                meta_title=title,
+                meta_description=self._sentence(15) if rng.random() < 0.5 else "",
+                # Счётчик включает и просмотры, уже свёрнутые в PostViewDaily
+                views_count=view_count + rng.randint(0, view_count * 3),
+                ratings_sum=sum(scores),
+                ratings_count=len(scores),
+                ratings_avg=sum(scores) / len(scores) if scores else None,
+                created_at=published_at - timedelta(days=rng.uniform(0, 14)),
+                updated_at=published_at + timedelta(days=rng.uniform(0, 30)),
+                published_at=published_at,
+                # Немного черновиков и постов без модерации — как на живом сайте
+                is_published=rng.random() < 0.97,
+                is_moderated=rng.random() < 0.98,
+                **rng.choice(bodies),
+            ))
+        BlogPost.objects.bulk_create(posts)
+
+        tag_links = [
+            BlogPost.tags.through(blogpost_id=post.pk, tag_id=tag_id)
+            for post in posts
+            for tag_id in set(rng.choices(tag_ids, cum_weights=tag_weights, k=rng.randint(1, 6)))
+        ]
+        BlogPost.tags.through.objects.bulk_create(tag_links, batch_size=5000)
+
+        rating_rows = [
+            PostRating(
+                post_id=post.pk, ip_address=ip, score=score,
+                created_at=min(post.published_at + timedelta(hours=rng.uniform(1, 2000)), self.now),
+            )
+            for post, scores in zip(posts, ratings)
+            for ip, score in zip(self._ips(len(scores)), scores)
+        ]
+        PostRating.objects.bulk_create(rating_rows, batch_size=5000)
+        counters["ratings"] += len(rating_rows)
+
+        view_rows = []
+        for post, (since, count) in zip(posts, views):
+            seconds = (self.now - since).total_seconds()
+            view_rows += [
+                PostView(post_id=post.pk, ip_address=ip, created_at=since + timedelta(seconds=rng.uniform(0, seconds)))
+                for ip in self._ips(count)
+            ]
+        PostView.objects.bulk_create(view_rows, batch_size=5000)
+        counters["views"] += len(view_rows)
+
+    def _ips(self, count):
+        """count разных IPv4-адресов (уникальность в пределах поста)"""
+        return [str(ipaddress.IPv4Address(n)) for n in self.rng.sample(range(16_777_216, 3_758_096_384), count)]
+
+
+@contextmanager
+def _without_auto_now(model, *field_names):
+    """Даёт записать свои даты в поля auto_now/auto_now_add (иначе bulk_create подставит «сейчас»)"""
+    fields = [model._meta.get_field(name) for name in field_names]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
@@ -0,0 +1,29 @@
+# blog/management/commands/rebuild_ratings.py
+from django.db import models
+from django.db.models.functions import Coalesce
+from django.core.management.base import BaseCommand
+
+from blog.models import BlogPost, PostRating
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает сводку оценок (сумма, количество, среднее) на BlogPost из таблицы PostRating"
+
+    def handle(self, *args, **options):
+        ratings = PostRating.objects.filter(post=models.OuterRef('pk')).values('post')
+        drifted = BlogPost.objects.annotate(
+            real_sum=Coalesce(
+                models.Subquery(ratings.annotate(total=models.Sum('score')).values('total')), 0
+            ),
+            real_count=Coalesce(
+                models.Subquery(ratings.annotate(total=models.Count('pk')).values('total')), 0
+            ),
+        ).exclude(
+            ratings_sum=models.F('real_sum'),
+            ratings_count=models.F('real_count'),
+        ).count()
+        if drifted:
+            self.stdout.write(self.style.WARNING(f"Расхождений со сводкой: {drifted}"))
+
+        updated = BlogPost.rebuild_rating_summary()
+        self.stdout.write(self.style.SUCCESS(f"Завершено. Пересчитано постов: {updated}"))
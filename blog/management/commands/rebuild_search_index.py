@@ -0,0 +1,23 @@
+# blog/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from blog.search import get_backend, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Пересобирает полнотекстовый индекс постов (FTS5 на SQLite, tsvector на PostgreSQL)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=200,
+            help="Сколько постов индексировать за одну транзакцию (по умолчанию 200)",
+        )
+
+    def handle(self, *args, **options):
+        if get_backend() is None:
+            raise CommandError(f"Поиск не поддерживается для БД {connection.vendor}")
+        indexed = rebuild_search_index(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"✅ Проиндексировано постов: {indexed}"))
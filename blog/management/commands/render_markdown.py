@@ -0,0 +1,48 @@
+# blog/management/commands/render_markdown.py
+from django.core.management.base import BaseCommand
+
+from blog.models import BlogPost, AboutPage
+
+
+class Command(BaseCommand):
+    help = "Пересобирает сохранённый HTML для BlogPost и AboutPage (только устаревший или всё с --force)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Пересобрать HTML для всех записей, даже если он актуален",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=200,
+            help="Размер пачки для bulk_update (по умолчанию 200)",
+        )
+
+    def handle(self, *args, **options):
+        force = options["force"]
+        batch_size = options["batch_size"]
+
+        for model in (BlogPost, AboutPage):
+            rendered = self._render_model(model, force, batch_size)
+            self.stdout.write(f"✅ {model._meta.verbose_name_plural}: пересобрано {rendered}")
+
+        self.stdout.write(self.style.SUCCESS("Завершено."))
+
+    def _render_model(self, model, force, batch_size):
+        # bulk_update не трогает updated_at — дата изменения записи остаётся прежней
+        queryset = model.objects.only("pk", "content_markdown", *model.RENDERED_FIELDS).order_by("pk")
+        rendered = 0
+        batch = []
+        for obj in queryset.iterator(chunk_size=batch_size):
+            if obj.render_content(force=force):
+                batch.append(obj)
+            if len(batch) >= batch_size:
+                model.objects.bulk_update(batch, model.RENDERED_FIELDS)
+                rendered += len(batch)
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, model.RENDERED_FIELDS)
+            rendered += len(batch)
+        return rendered
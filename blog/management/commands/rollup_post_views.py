@@ -0,0 +1,104 @@
+# blog/management/commands/rollup_post_views.py
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import models
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from blog.models import PostView, PostViewDaily
+
+
+def start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class Command(BaseCommand):
+    help = (
+        "Собирает суточные сводки просмотров (PostViewDaily) за завершённые дни "
+        "и удаляет пачками строки PostView старше срока хранения."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            default=settings.POST_VIEW_RETENTION_DAYS,
+            help="Сколько дней хранить сырые просмотры (по умолчанию POST_VIEW_RETENTION_DAYS)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Размер пачки для записи сводок и удаления строк",
+        )
+        parser.add_argument(
+            "--no-prune",
+            action="store_true",
+            help="Только собрать сводки, ничего не удалять",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        today = timezone.localdate()
+
+        rolled = self._rollup(today, chunk_size)
+        self.stdout.write(f"✅ Суточных сводок записано: {rolled}")
+
+        if not options["no_prune"]:
+            retention_days = max(options["retention_days"], 1)
+            cutoff = start_of_day(today - timedelta(days=retention_days))
+            deleted = self._prune(cutoff, chunk_size)
+            self.stdout.write(f"🧹 Удалено просмотров старше {cutoff:%d.%m.%Y}: {deleted}")
+
+        self.stdout.write(self.style.SUCCESS("Завершено."))
+
+    def _rollup(self, today, chunk_size):
+        # Последний собранный день пересчитываем — он мог быть собран не полностью
+        last_day = PostViewDaily.objects.aggregate(last=models.Max("date"))["last"]
+        views = PostView.objects.filter(created_at__lt=start_of_day(today))
+        if last_day:
+            views = views.filter(created_at__gte=start_of_day(last_day))
+
+        rows = views.annotate(day=TruncDate("created_at")).values("post_id", "day").annotate(
+            total=models.Count("pk"),
+            unique=models.Count("ip_address", distinct=True),
+        ).order_by()
+
+        rolled = 0
+        batch = []
+        for row in rows.iterator(chunk_size=chunk_size):
+            batch.append(PostViewDaily(
+                post_id=row["post_id"],
+                date=row["day"],
+                unique_visitors=row["unique"],
+                total_views=row["total"],
+            ))
+            if len(batch) >= chunk_size:
+                rolled += self._save_batch(batch)
+                batch = []
+        if batch:
+            rolled += self._save_batch(batch)
+        return rolled
+
+    def _save_batch(self, batch):
+        PostViewDaily.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=["post", "date"],
+            update_fields=["unique_visitors", "total_views"],
+        )
+        return len(batch)
+
+    def _prune(self, cutoff, chunk_size):
+        # Удаляем пачками, чтобы не держать долгую блокировку на SQLite
+        deleted = 0
+        while True:
+            ids = list(
+                PostView.objects.filter(created_at__lt=cutoff).values_list("pk", flat=True)[:chunk_size]
+            )
+            if not ids:
+                return deleted
+            PostView.objects.filter(pk__in=ids).delete()
+            deleted += len(ids)
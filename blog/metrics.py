@@ -0,0 +1,252 @@
+# blog/metrics.py
+"""
+Метрики приложения в текстовом формате Prometheus (/metrics/).
+
+Каждый воркер gunicorn копит счётчики и гистограммы в памяти, а фоновый поток
+раз в METRICS_FLUSH_INTERVAL секунд сбрасывает их в файл METRICS_DIR/<pid>-<start_ns>.json
+(запись через временный файл и os.replace — читатель не увидит половину файла).
+Эндпоинт складывает файлы всех воркеров, поэтому ответ не зависит от того,
+какой воркер принял запрос. Файлы прошлого запуска удаляет gunicorn.conf.py
+(on_starting); файлы умерших воркеров остаются — их счётчики уже накоплены.
+Время старта в имени не даёт перезапущенному воркеру с тем же PID затереть
+файл предшественника — иначе суммы счётчиков пошли бы назад.
+
+Что считается:
+  * время ответа по вьюхам (гистограмма) и ответы по статусам;
+  * SQL-запросы: число и суммарное время по вьюхам;
+  * попадания в кэши: HTML контента (render), страниц (page), снимок дерева
+    локаций (location_tree);
+  * записи оценок;
+  * глубина очереди просмотров — считается в момент запроса метрик.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+ENABLED = getattr(settings, "METRICS_ENABLED", True)
+METRICS_DIR = getattr(settings, "METRICS_DIR", os.path.join(settings.BASE_DIR, "spool", "metrics"))
+FLUSH_INTERVAL = getattr(settings, "METRICS_FLUSH_INTERVAL", 5)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# {имя: (тип, описание)}
+METRICS = {
+    "kazan_http_request_duration_seconds": ("histogram", "Время ответа по вьюхам"),
+    "kazan_http_responses_total": ("counter", "Ответы по вьюхам и статусам"),
+    "kazan_db_queries_total": ("counter", "SQL-запросы по вьюхам"),
+    "kazan_db_query_duration_seconds_total": ("counter", "Суммарное время SQL-запросов по вьюхам"),
+    "kazan_cache_requests_total": ("counter", "Обращения к кэшам (render, page, location_tree) по результату"),
+    "kazan_rating_writes_total": ("counter", "Записи оценок постов: created, changed, unchanged"),
+    "kazan_view_counter_queue_depth": ("gauge", "Просмотры в очереди на диске, ещё не перенесённые в БД"),
+    "kazan_metrics_workers": ("gauge", "Файлов метрик воркеров (включая завершившихся)"),
+}
+
+_lock = threading.Lock()
+_write_lock = threading.Lock()  # файл пишут фоновый поток и /metrics/ — снимки не должны обгонять друг друга
+_counters = defaultdict(float)  # (имя, метки) -> значение
+_histograms = {}  # (имя, метки) -> [счётчики корзин..., сумма, количество]
+_dirty = False
+_flusher = None
+_file = None  # (pid, путь к файлу процесса)
+
+
+def _key(name, labels):
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    """Увеличивает счётчик name с метками labels"""
+    global _dirty
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] += amount
+        _dirty = True
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    """Добавляет значение в гистограмму name"""
+    global _dirty
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * len(buckets) + [0.0, 0]
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                histogram[index] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+        _dirty = True
+
+
+def cache_result(cache, hit):
+    inc("kazan_cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+
+# =============== Файлы воркеров ===============
+def flush():
+    """Сбрасывает метрики процесса в его файл, если с прошлого раза что-то изменилось"""
+    global _dirty
+    if not ENABLED or not _dirty:
+        return
+    path = _file_path()
+    with _write_lock:
+        with _lock:
+            data = {
+                "counters": [[name, dict(labels), value] for (name, labels), value in _counters.items()],
+                "histograms": [[name, dict(labels), list(values)] for (name, labels), values in _histograms.items()],
+            }
+            _dirty = False
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+            json.dump(data, file)
+        os.replace(f"{path}.tmp", path)
+
+
+def _file_path():
+    global _file
+    pid = os.getpid()
+    # После fork (gunicorn) PID другой — новому процессу новый файл
+    if _file is None or _file[0] != pid:
+        _file = (pid, os.path.join(METRICS_DIR, f"{pid}-{time.time_ns()}.json"))
+    return _file[1]
+
+
+def collect():
+    """Метрики всех воркеров: (counters, histograms, число файлов)"""
+    flush()
+    counters = defaultdict(float)
+    histograms = {}
+    files = 0
+    if os.path.isdir(METRICS_DIR):
+        for name in os.listdir(METRICS_DIR):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(METRICS_DIR, name), encoding="utf-8") as file:
+                    data = json.load(file)
+            except (OSError, ValueError):
+                continue  # файл удалили или он битый — пропускаем
+            files += 1
+            for metric, labels, value in data["counters"]:
+                counters[_key(metric, labels)] += value
+            for metric, labels, values in data["histograms"]:
+                key = _key(metric, labels)
+                if key in histograms:
+                    histograms[key] = [a + b for a, b in zip(histograms[key], values)]
+                else:
+                    histograms[key] = list(values)
+    return counters, histograms, files
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except OSError:
+            logger.exception("Не удалось записать метрики воркера")
+
+
+def _ensure_flusher():
+    global _flusher
+    # После fork (gunicorn) поток родителя не существует — проверяем живость
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True)
+            _flusher.start()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels, **extra):
+    items = [*labels, *extra.items()]
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in items) + "}"
+
+
+def render():
+    """Текст для Prometheus"""
+    from .view_counter import pending_views_count
+
+    counters, histograms, files = collect()
+    gauges = {
+        _key("kazan_view_counter_queue_depth", {}): pending_views_count(),
+        _key("kazan_metrics_workers", {}): files,
+    }
+    lines = []
+    for metric, (kind, description) in METRICS.items():
+        lines += [f"# HELP {metric} {description}", f"# TYPE {metric} {kind}"]
+        if kind == "histogram":
+            for (name, labels), values in sorted(histograms.items()):
+                if name != metric:
+                    continue
+                for bound, count in zip(LATENCY_BUCKETS, values):
+                    lines.append(f"{metric}_bucket{_labels(labels, le=bound)} {count}")
+                lines.append(f'{metric}_bucket{_labels(labels, le="+Inf")} {values[-1]}')
+                lines.append(f"{metric}_sum{_labels(labels)} {values[-2]}")
+                lines.append(f"{metric}_count{_labels(labels)} {values[-1]}")
+        else:
+            source = gauges if kind == "gauge" else counters
+            for (name, labels), value in sorted(source.items()):
+                if name == metric:
+                    lines.append(f"{metric}{_labels(labels)} {int(value) if value == int(value) else value}")
+    return "\n".join(lines) + "\n"
+
+
+# =============== Middleware ===============
+class MetricsMiddleware:
+    """Время ответа и SQL по вьюхам. Ставить в начало MIDDLEWARE"""
+
+    def __init__(self, get_response):
+        if not ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = [0, 0.0]
+
+        def count_query(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries[0] += 1
+                queries[1] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_query))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, "resolver_match", None)
+        # Имя вьюхи, а не путь: у 404 и ботов путей бесконечно много
+        view = match.view_name if match else "unmatched"
+        observe("kazan_http_request_duration_seconds", elapsed, view=view)
+        inc("kazan_http_responses_total", view=view, status=response.status_code)
+        if queries[0]:
+            inc("kazan_db_queries_total", queries[0], view=view)
+            inc("kazan_db_query_duration_seconds_total", queries[1], view=view)
+        _ensure_flusher()
+        return response
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_alter_blogpost_meta_description'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aboutpage',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='Хэш контента'),
+        ),
+        migrations.AddField(
+            model_name='aboutpage',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='HTML контента'),
+        ),
+        migrations.AddField(
+            model_name='aboutpage',
+            name='content_renderer_version',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Версия рендерера'),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='Хэш контента'),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='HTML контента'),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='content_renderer_version',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Версия рендерера'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:23
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_rating_summary(apps, schema_editor):
+    BlogPost = apps.get_model('blog', 'BlogPost')
+    PostRating = apps.get_model('blog', 'PostRating')
+    ratings = PostRating.objects.filter(post=models.OuterRef('pk')).values('post')
+    BlogPost.objects.update(
+        ratings_sum=Coalesce(models.Subquery(ratings.annotate(total=models.Sum('score')).values('total')), 0),
+        ratings_count=Coalesce(models.Subquery(ratings.annotate(total=models.Count('pk')).values('total')), 0),
+        ratings_avg=models.Subquery(
+            ratings.annotate(avg=models.Avg('score', output_field=models.FloatField())).values('avg')
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0010_rendered_content_html'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='ratings_avg',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Средняя оценка'),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='ratings_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество оценок'),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='ratings_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Сумма оценок'),
+        ),
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(fields=['-ratings_avg', '-views_count'], name='blog_blogpo_ratings_0955d6_idx'),
+        ),
+        migrations.RunPython(fill_rating_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:30
+
+from django.db import migrations, models
+
+# MP_Node.steplen по умолчанию — у исторической модели атрибута нет
+STEPLEN = 4
+
+
+def fill_location_paths(apps, schema_editor):
+    Location = apps.get_model('blog', 'Location')
+    by_path = {}
+    nodes = []
+    for node in Location.objects.order_by('path'):
+        parent = by_path.get(node.path[:-STEPLEN])
+        if parent is None:
+            node.slug_path = node.slug
+            node.display_path = node.name
+        else:
+            node.slug_path = f"{parent.slug_path}/{node.slug}"
+            node.display_path = f"{parent.display_path} / {node.name}"
+        by_path[node.path] = node
+        nodes.append(node)
+    Location.objects.bulk_update(nodes, ['slug_path', 'display_path'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0011_blogpost_rating_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='display_path',
+            field=models.CharField(blank=True, editable=False, max_length=1000, verbose_name='Полный путь'),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='slug_path',
+            field=models.CharField(default='', editable=False, max_length=1000, verbose_name="Путь из slug'ов"),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_location_paths, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='location',
+            name='slug_path',
+            field=models.CharField(editable=False, max_length=1000, unique=True, verbose_name="Путь из slug'ов"),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0012_location_materialized_paths'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostViewDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('unique_visitors', models.PositiveIntegerField(default=0, verbose_name='Уникальных посетителей')),
+                ('total_views', models.PositiveIntegerField(default=0, verbose_name='Всего просмотров')),
+            ],
+            options={
+                'verbose_name': 'Просмотры поста за сутки',
+                'verbose_name_plural': 'Просмотры постов по дням',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='postview',
+            index=models.Index(fields=['created_at'], name='blog_postvi_created_fbb95a_idx'),
+        ),
+        migrations.AddField(
+            model_name='postviewdaily',
+            name='post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_views', to='blog.blogpost'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='postviewdaily',
+            unique_together={('post', 'date')},
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:33
+
+import re
+from html import unescape
+
+from django.db import migrations, models
+from django.utils.html import strip_tags
+
+# Копия html_to_excerpt из blog/utils.py на момент миграции: код приложения
+# меняется, а миграция должна работать одинаково
+BLOCK_END_RE = re.compile(r'<(br|hr|/p|/h[1-6]|/li|/div|/blockquote|/pre)\b[^>]*>', re.IGNORECASE)
+EXCERPT_LENGTH = 300
+
+
+def html_to_excerpt(html):
+    text = " ".join(unescape(strip_tags(BLOCK_END_RE.sub(' ', html or ""))).split())
+    if len(text) <= EXCERPT_LENGTH:
+        return text
+    return text[:EXCERPT_LENGTH - 1].rsplit(" ", 1)[0] + "…"
+
+
+def fill_excerpts(apps, schema_editor):
+    # Только из сохранённого HTML. Записи без него устарели — excerpt появится
+    # при первом показе или после python manage.py render_markdown
+    for model_name in ('BlogPost', 'AboutPage'):
+        model = apps.get_model('blog', model_name)
+        batch = []
+        queryset = model.objects.exclude(content_html='').only('pk', 'content_html')
+        for obj in queryset.iterator(chunk_size=200):
+            obj.excerpt = html_to_excerpt(obj.content_html)
+            batch.append(obj)
+            if len(batch) >= 200:
+                model.objects.bulk_update(batch, ['excerpt'])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, ['excerpt'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0013_postview_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aboutpage',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=300, verbose_name='Краткое описание'),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=300, verbose_name='Краткое описание'),
+        ),
+        migrations.RunPython(fill_excerpts, migrations.RunPython.noop),
+    ]
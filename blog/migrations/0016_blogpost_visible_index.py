@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0015_blogpost_published_keyset_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='blogpost',
+            name='blog_blogpo_publish_3037a1_idx',
+        ),
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(condition=models.Q(('is_moderated', True), ('is_published', True), ('published_at__isnull', False)), fields=['-published_at', '-id'], name='blogpost_visible_idx'),
+        ),
+    ]
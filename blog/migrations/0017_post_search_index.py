@@ -0,0 +1,42 @@
+# Таблица полнотекстового индекса постов (FTS5 на SQLite, tsvector на PostgreSQL).
+# Заполняется командой rebuild_search_index.
+# DDL записан здесь, а не берётся из blog/search.py: миграция не должна меняться вместе с кодом.
+
+from django.db import migrations
+
+CREATE_SQL = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS blog_post_search USING fts5("
+        "title, description, body, tags, locations, "
+        "tokenize = 'unicode61 remove_diacritics 2')",
+    ],
+    'postgresql': [
+        "CREATE TABLE IF NOT EXISTS blog_post_search ("
+        "post_id bigint PRIMARY KEY REFERENCES blog_blogpost (id) "
+        "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+        "body text NOT NULL, "
+        "document tsvector NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS blog_post_search_document_idx ON blog_post_search USING GIN (document)",
+    ],
+}
+
+
+def create_search_index(apps, schema_editor):
+    for sql in CREATE_SQL.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE_SQL:
+        schema_editor.execute("DROP TABLE IF EXISTS blog_post_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0016_blogpost_visible_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,20 @@
+# post_id индекса поиска на PostgreSQL — bigint, как у blog_blogpost.id (BigAutoField).
+# Новые базы получают bigint сразу из 0017, эта миграция чинит созданные раньше.
+
+from django.db import migrations
+
+
+def widen_post_id(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("ALTER TABLE blog_post_search ALTER COLUMN post_id TYPE bigint")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0019_image_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(widen_post_id, migrations.RunPython.noop),
+    ]
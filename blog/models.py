@@ -1,15 +1,22 @@
 import os
 
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models.functions import Cast, Coalesce
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.utils.text import slugify
 from django.utils import timezone
+from django.utils.safestring import mark_safe
 from markdownx.models import MarkdownxField
 from treebeard.mp_tree import MP_Node
 
+from blog.location_tree import get_location_tree, invalidate_location_tree
+from blog.metrics import cache_result, inc
+from blog.image_variants import add_picture_sources
+from blog.page_cache import invalidate_pages
+from blog.search import schedule_location_reindex
 from blog.upload_paths import cover_upload_to, gallery_upload_to, about_page_cover_upload_to
-from blog.utils import markdownify_with_video
+from blog.utils import markdownify_with_video, markdown_content_hash, html_to_excerpt, MARKDOWN_RENDERER_VERSION
 
 
 # =============== ЛОКАЦИИ ===============
@@ -17,6 +24,9 @@ class Location(MP_Node):
     name = models.CharField("Название", max_length=200)
     slug = models.SlugField("Slug", max_length=200, unique=True)
     description = models.TextField("Описание", blank=True)
+    # Материализованные пути — пересчитываются в save() и move(), в том числе для потомков
+    slug_path = models.CharField("Путь из slug'ов", max_length=1000, unique=True, editable=False)
+    display_path = models.CharField("Полный путь", max_length=1000, blank=True, editable=False)
 
     node_order_by = ['name']
 
@@ -30,28 +40,70 @@ class Location(MP_Node):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        old_slug_path = self.slug_path
+        old_display_path = self.display_path
+        self._set_paths(self.get_parent() if self.depth and self.depth > 1 else None)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = set(update_fields) | {"slug_path", "display_path"}
         super().save(*args, **kwargs)
+        if old_slug_path and (old_slug_path, old_display_path) != (self.slug_path, self.display_path):
+            self._update_descendant_paths()
+
+    def move(self, target, pos=None):
+        super().move(target, pos)
+        # После move() объект устарел (treebeard меняет path в БД) — перечитываем
+        node = Location.objects.get(pk=self.pk)
+        node._set_paths(node.get_parent())
+        Location.objects.filter(pk=node.pk).update(slug_path=node.slug_path, display_path=node.display_path)
+        node._update_descendant_paths()
+        invalidate_location_tree()
+        invalidate_pages('locations')
+        schedule_location_reindex(node)
+        self.path, self.depth = node.path, node.depth
+        self.slug_path, self.display_path = node.slug_path, node.display_path
+
+    def _set_paths(self, parent):
+        if parent is None:
+            self.slug_path = self.slug
+            self.display_path = self.name
+        else:
+            self.slug_path = f"{parent.slug_path}/{self.slug}"
+            self.display_path = f"{parent.display_path} / {self.name}"
+
+    def _update_descendant_paths(self):
+        """Пересчитывает пути всех потомков одним проходом по дереву"""
+        by_path = {self.path: self}
+        changed = []
+        # Сортировка по path гарантирует, что родитель обработан раньше детей
+        for node in self.get_descendants().order_by("path"):
+            node._set_paths(by_path[node.path[:-self.steplen]])
+            by_path[node.path] = node
+            changed.append(node)
+        if changed:
+            Location.objects.bulk_update(changed, ["slug_path", "display_path"], batch_size=500)
 
     def get_full_path(self):
-        return " / ".join(
-            node.name for node in list(self.get_ancestors()) + [self]
-        )
+        return self.display_path
 
     def get_path_slug(self):
         """Возвращает путь из slug'ов: 'kazan/kazanskiy-kreml'"""
-        ancestors = list(self.get_ancestors()) + [self]
-        return "/".join(node.slug for node in ancestors)
+        return self.slug_path
 
     def get_absolute_url(self):
         return f"/location/{self.get_path_slug()}/"
 
+    def get_cached_ancestors(self):
+        """Предки из снимка дерева (без запросов к БД)"""
+        return get_location_tree().ancestors(self.pk)
+
+    def get_cached_children(self):
+        return get_location_tree().children(self.pk)
+
     def get_breadcrumbs(self):
         """Возвращает список кортежей (локация, URL) для хлебных крошек"""
-        ancestors = list(self.get_ancestors()) + [self]
-        return [
-            (node, f"/location/{'/'.join(a.slug for a in list(node.get_ancestors()) + [node])}/")
-            for node in ancestors
-        ]
+        ancestors = self.get_cached_ancestors() + [self]
+        return [(node, node.get_absolute_url()) for node in ancestors]
 
 # =============== ТЕГИ ===============
 class Tag(models.Model):
@@ -75,8 +127,96 @@ class Tag(models.Model):
         return reverse("blog:tag_detail", kwargs={"slug": self.slug})
 
 
+# =============== ПРЕДРЕНДЕРЕННЫЙ MARKDOWN ===============
+class RenderedMarkdownModel(models.Model):
+    """
+    Хранит очищенный HTML рядом с content_markdown.
+    HTML пересобирается только при изменении Markdown или версии рендерера.
+    """
+    content_html = models.TextField("HTML контента", blank=True, editable=False)
+    content_hash = models.CharField("Хэш контента", max_length=64, blank=True, editable=False)
+    content_renderer_version = models.PositiveSmallIntegerField("Версия рендерера", default=0, editable=False)
+    # Простой текст из начала HTML — для карточек и meta description
+    excerpt = models.CharField("Краткое описание", max_length=300, blank=True, editable=False)
+
+    RENDERED_FIELDS = ("content_html", "content_hash", "content_renderer_version", "excerpt")
+
+    class Meta:
+        abstract = True
+
+    def is_content_stale(self):
+        return (
+                self.content_renderer_version != MARKDOWN_RENDERER_VERSION
+                or self.content_hash != markdown_content_hash(self.content_markdown)
+        )
+
+    def render_content(self, force=False):
+        """Пересобирает HTML, если он устарел. Возвращает True, если поля изменились"""
+        if not force and not self.is_content_stale():
+            return False
+        self.content_html = add_picture_sources(markdownify_with_video(self.content_markdown))
+        self.excerpt = html_to_excerpt(self.content_html)
+        self.content_hash = markdown_content_hash(self.content_markdown)
+        self.content_renderer_version = MARKDOWN_RENDERER_VERSION
+        return True
+
+    def get_content_html(self):
+        """HTML для шаблона. Устаревший HTML пересобирается и сохраняется без изменения updated_at"""
+        rendered = self.render_content()
+        cache_result("render", not rendered)
+        if rendered and self.pk:
+            type(self).objects.filter(pk=self.pk).update(
+                **{field: getattr(self, field) for field in self.RENDERED_FIELDS}
+            )
+        return mark_safe(self.content_html)
+
+    def get_excerpt(self):
+        """Текст для краткого описания: SEO Description или начало контента"""
+        return self.meta_description or self.excerpt
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "content_markdown" in update_fields:
+            if self.render_content() and update_fields is not None:
+                kwargs["update_fields"] = set(update_fields) | set(self.RENDERED_FIELDS)
+        super().save(*args, **kwargs)
+
+
 # =============== ЗАПИСЬ БЛОГА ===============
-class BlogPost(models.Model):
+def visible_posts_q(prefix='', now=None):
+    """
+    Условие «пост виден читателям». prefix — для фильтров через связь
+    (например, 'posts__' в запросах от Tag).
+    """
+    return models.Q(**{
+        f'{prefix}is_published': True,
+        f'{prefix}is_moderated': True,
+        f'{prefix}published_at__isnull': False,
+        f'{prefix}published_at__lte': now or timezone.now(),
+    })
+
+
+class BlogPostQuerySet(models.QuerySet):
+    def visible(self, now=None):
+        """Опубликованные, отмодерированные и уже наступившие посты"""
+        return self.filter(visible_posts_q(now=now))
+
+    def for_cards(self):
+        """
+        Всё, что нужно partials/post_card.html, за постоянное число запросов:
+        автор и локация — JOIN, теги — один prefetch, тяжёлые колонки с контентом
+        не грузятся (для описания есть сохранённый excerpt).
+        """
+        return self.select_related('author', 'location').prefetch_related('tags').defer(
+            'content_markdown', 'content_html'
+        )
+
+    def best(self):
+        """Оценённые посты по убыванию средней оценки (сортировка по индексу, без GROUP BY)"""
+        return self.filter(ratings_count__gt=0).order_by('-ratings_avg', '-views_count')
+
+
+class BlogPost(RenderedMarkdownModel):
     title = models.CharField("Заголовок", max_length=255)
     slug = models.SlugField("Slug", max_length=255, unique=True)
 
@@ -113,6 +253,8 @@ class BlogPost(models.Model):
         null=True,
         max_length=650,
     )
+    # Уменьшенные копии обложки для srcset (blog/image_variants.py)
+    cover_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     # SEO
     meta_title = models.CharField("SEO Title", max_length=255, blank=True)
@@ -120,6 +262,10 @@ class BlogPost(models.Model):
 
     # Статистика
     views_count = models.PositiveIntegerField("Просмотры", default=0)
+    # Сводка оценок — поддерживается в PostRating.rate(), чинится командой rebuild_ratings
+    ratings_sum = models.PositiveIntegerField("Сумма оценок", default=0, editable=False)
+    ratings_count = models.PositiveIntegerField("Количество оценок", default=0, editable=False)
+    ratings_avg = models.FloatField("Средняя оценка", null=True, blank=True, editable=False)
 
     # Публикация
     created_at = models.DateTimeField("Создано", auto_now_add=True)
@@ -128,10 +274,23 @@ class BlogPost(models.Model):
     is_published = models.BooleanField("Опубликовано", default=False)
     is_moderated = models.BooleanField("Прошёл модерацию", default=False)
 
+    objects = BlogPostQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Запись блога"
         verbose_name_plural = "Записи блога"
         ordering = ["-published_at"]
+        indexes = [
+            models.Index(fields=["-ratings_avg", "-views_count"]),
+            # Ленты видимых постов и keyset-пагинация (blog/pagination.py).
+            # published_at <= now в условие не входит — оно меняется со временем,
+            # остаток фильтра дочитывается по индексу в порядке сортировки.
+            models.Index(
+                fields=["-published_at", "-id"],
+                name="blogpost_visible_idx",
+                condition=models.Q(is_published=True, is_moderated=True, published_at__isnull=False),
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -151,8 +310,9 @@ class BlogPost(models.Model):
         )
 
     def get_absolute_url(self):
-        location_path = self.location.get_path_slug()
-        return f"/post/{location_path}/{self.slug}/"
+        # Локацию берём из снимка дерева — не нужен ни select_related, ни запрос
+        location = get_location_tree().get(self.location_id) or self.location
+        return f"/post/{location.get_path_slug()}/{self.slug}/"
 
     def get_seo_title(self):
         return self.meta_title or self.title
@@ -160,13 +320,49 @@ class BlogPost(models.Model):
     @property
     def average_rating(self):
         """Средняя оценка поста (округлённая до 1 знака)"""
-        ratings = self.ratings.aggregate(avg=models.Avg('score'))['avg']
-        return round(ratings, 1) if ratings else None
+        return round(self.ratings_avg, 1) if self.ratings_count else None
 
     @property
     def rating_count(self):
         """Количество оценок"""
-        return self.ratings.count()
+        return self.ratings_count
+
+    @classmethod
+    def apply_rating_delta(cls, post_id, delta_sum, delta_count):
+        """Атомарно сдвигает сводку оценок поста одним UPDATE"""
+        new_count = models.F('ratings_count') + delta_count
+        cls.objects.filter(pk=post_id).update(
+            ratings_sum=models.F('ratings_sum') + delta_sum,
+            ratings_count=new_count,
+            ratings_avg=models.Case(
+                models.When(
+                    ratings_count__gt=-delta_count,
+                    then=Cast(
+                        models.F('ratings_sum') + delta_sum, models.FloatField()
+                    ) / new_count,
+                ),
+                default=None,
+                output_field=models.FloatField(),
+            ),
+        )
+
+    @classmethod
+    def rebuild_rating_summary(cls, queryset=None):
+        """Пересчитывает сводку оценок из PostRating. Возвращает число обновлённых постов"""
+        if queryset is None:
+            queryset = cls.objects.all()
+        ratings = PostRating.objects.filter(post=models.OuterRef('pk')).values('post')
+        return queryset.update(
+            ratings_sum=Coalesce(
+                models.Subquery(ratings.annotate(total=models.Sum('score')).values('total')), 0
+            ),
+            ratings_count=Coalesce(
+                models.Subquery(ratings.annotate(total=models.Count('pk')).values('total')), 0
+            ),
+            ratings_avg=models.Subquery(
+                ratings.annotate(avg=models.Avg('score', output_field=models.FloatField())).values('avg')
+            ),
+        )
 
     def get_breadcrumbs(self):
         """Хлебные крошки для поста: Главная > Локация1 > Локация2 > Название поста"""
@@ -181,6 +377,14 @@ class BlogPost(models.Model):
         crumbs.append((self.title, None))
         return crumbs
 
+    def get_related_posts(self):
+        """Похожие посты из таблицы, собранной командой build_related_posts (один запрос)"""
+        return BlogPost.objects.visible().filter(
+            related_to__post=self
+        ).only(
+            'title', 'slug', 'location_id', 'cover_image', 'cover_variants', 'published_at'
+        ).order_by('related_to__rank')
+
 # =============== ГАЛЕРЕЯ ===============
 class PostImage(models.Model):
     post = models.ForeignKey(
@@ -194,6 +398,7 @@ class PostImage(models.Model):
         upload_to=gallery_upload_to,
         max_length=650,
     )
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     caption = models.CharField("Подпись", max_length=200, blank=True)
     order = models.PositiveSmallIntegerField("Порядок", default=0)
 
@@ -229,6 +434,31 @@ class PostRating(models.Model):
     def __str__(self):
         return f"{self.post.title} — {self.score}★ от {self.ip_address}"
 
+    @classmethod
+    def rate(cls, post, ip_address, score):
+        """
+        Создаёт или меняет оценку и в той же транзакции сдвигает сводку на BlogPost.
+        При смене оценки тем же IP учитывается только разница.
+        """
+        with transaction.atomic():
+            rating = cls.objects.select_for_update().filter(post=post, ip_address=ip_address).first()
+            if rating is None:
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(post=post, ip_address=ip_address, score=score)
+                except IntegrityError:
+                    # Параллельный запрос с того же IP успел создать оценку — повторяем как изменение
+                    return cls.rate(post, ip_address, score)
+                BlogPost.apply_rating_delta(post.pk, score, 1)
+                inc("kazan_rating_writes_total", action="created")
+            elif rating.score != score:
+                old_score, rating.score = rating.score, score
+                rating.save(update_fields=['score'])
+                BlogPost.apply_rating_delta(post.pk, score - old_score, 0)
+                inc("kazan_rating_writes_total", action="changed")
+            else:
+                inc("kazan_rating_writes_total", action="unchanged")
+
 
 # =============== Умный счетчик просмотров ===============
 class PostView(models.Model):
@@ -240,10 +470,65 @@ class PostView(models.Model):
         unique_together = ('post', 'ip_address', 'created_at')
         verbose_name = "Просмотр поста"
         verbose_name_plural = "Просмотры постов"
+        indexes = [
+            # Очистка старых строк и date_hierarchy в админке
+            models.Index(fields=['created_at']),
+        ]
+
+
+class PostViewDaily(models.Model):
+    """Суточная сводка просмотров поста (собирается командой rollup_post_views)"""
+    post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='daily_views')
+    date = models.DateField("Дата")
+    unique_visitors = models.PositiveIntegerField("Уникальных посетителей", default=0)
+    total_views = models.PositiveIntegerField("Всего просмотров", default=0)
+
+    class Meta:
+        unique_together = ('post', 'date')
+        verbose_name = "Просмотры поста за сутки"
+        verbose_name_plural = "Просмотры постов по дням"
+        ordering = ["-date"]
+
+    def __str__(self):
+        return f"{self.post.title} — {self.date}: {self.total_views}"
+
+
+class RelatedPost(models.Model):
+    """Соседи поста по тегам, локации и тексту (собирается командой build_related_posts)"""
+    post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='related_links')
+    related = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='related_to')
+    rank = models.PositiveSmallIntegerField("Место")
+    score = models.FloatField("Близость")
+
+    class Meta:
+        unique_together = ('post', 'related')
+        verbose_name = "Похожий пост"
+        verbose_name_plural = "Похожие посты"
+        ordering = ['post', 'rank']
+        indexes = [
+            models.Index(fields=['post', 'rank']),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id} → {self.related_id} ({self.score:.3f})"
+
+
+class ContentImage(models.Model):
+    """Картинка из текста поста (загрузка markdownx) и её уменьшенные копии"""
+    name = models.CharField("Файл", max_length=650, unique=True)
+    variants = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Картинка из текста"
+        verbose_name_plural = "Картинки из текста"
+
+    def __str__(self):
+        return self.name
 
 
 # =============== СТРАНИЦА "О НАС" ===============
-class AboutPage(models.Model):
+class AboutPage(RenderedMarkdownModel):
     title = models.CharField("Заголовок", max_length=255)
     slug = models.SlugField("Slug", max_length=255, unique=False)  # ← не уникальный!
     author = models.ForeignKey(
@@ -264,6 +549,7 @@ class AboutPage(models.Model):
         blank=True,
         null=True
     )
+    cover_variants = models.JSONField(default=dict, blank=True, editable=False)
     # SEO
     meta_title = models.CharField("SEO Title", max_length=255, blank=True)
     meta_description = models.CharField("SEO Description", max_length=160, blank=True)
@@ -305,7 +591,7 @@ class AboutPage(models.Model):
         return self.meta_title or self.title
 
     def get_markdown_content(self):
-        return markdownify_with_video(self.content_markdown)
+        return self.get_content_html()
 
 
 # =============== ГАЛЕРЕЯ ДЛЯ "О НАС" ===============
@@ -324,6 +610,7 @@ class AboutPageImage(models.Model):
         "Изображение",
         upload_to=about_page_gallery_upload_to,
     )
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     caption = models.CharField("Подпись", max_length=200, blank=True)
     order = models.PositiveSmallIntegerField("Порядок", default=0)
 
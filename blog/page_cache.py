@@ -0,0 +1,220 @@
+# blog/page_cache.py
+"""
+Кэш готовых страниц для анонимных читателей.
+
+Ключ страницы — путь + разрешённые GET-параметры + «поколения» групп, от
+которых страница зависит (posts, tags, locations, about, post:<slug>).
+Сигналы из blog/signals.py после коммита сдвигают поколение нужных групп,
+и все зависящие страницы перестают находиться в кэше — без перебора ключей.
+
+CSRF-токен в кэшированный HTML не попадает: при рендере вместо него
+подставляется заглушка, которая заменяется токеном текущего запроса
+при каждой отдаче страницы.
+
+Те же поколения дают валидаторы условного GET: ETag — хэш пути и поколений,
+Last-Modified — время последнего сдвига поколения (т.е. последней правки
+поста, оценки, тега, локации или пачки просмотров). Ответ 304 отдаётся
+без рендера шаблона и без запросов к БД, если страница есть в кэше.
+
+Отложенная публикация видимость меняет, а пост не сохраняет. Поэтому время
+ближайшей запланированной публикации хранится в общем кэше, и когда оно
+наступает, первый же запрос сдвигает поколения posts и related.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache as default_cache, caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response
+from django.utils import timezone
+from django.utils.http import http_date
+
+from .metrics import cache_result
+
+PAGE_CACHE_ALIAS = getattr(settings, "PAGE_CACHE_ALIAS", "pages")
+PAGE_CACHE_ENABLED = getattr(settings, "PAGE_CACHE_ENABLED", True)
+PAGE_CACHE_TIMEOUT = getattr(settings, "PAGE_CACHE_TIMEOUT", 600)
+# Поколение 'views' (счётчики просмотров на страницах) сдвигается не чаще раза за интервал
+VIEWS_GENERATION_INTERVAL = getattr(settings, "PAGE_CACHE_VIEWS_INTERVAL", 3600)
+
+CSRF_PLACEHOLDER = "__page_cache_csrf_token__"
+GENERATION_KEY = "blog:page_cache:generation:{}"
+NEXT_PUBLICATION_KEY = "blog:page_cache:next_publication"
+NO_SCHEDULED_PUBLICATION = 0
+
+
+def _generations(groups, create=True):
+    """
+    Текущие поколения групп. Отсутствующее поколение создаётся новым,
+    а при create=False вместо этого возвращается None
+    """
+    cache = caches[PAGE_CACHE_ALIAS]
+    keys = [GENERATION_KEY.format(group) for group in groups]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            if not create:
+                return None
+            # Новое значение, а не 0 — иначе после вытеснения ключа ожили бы старые страницы
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def generation_token(groups):
+    """Строка поколений групп — для ключей других кэшей, зависящих от тех же данных"""
+    return ".".join(map(str, _generations(groups)))
+
+
+def _bump(groups):
+    cache = caches[PAGE_CACHE_ALIAS]
+    now = time.time_ns()
+    cache.set_many({GENERATION_KEY.format(group): now for group in groups}, timeout=None)
+
+
+def touch_views_generation():
+    """Сообщает, что в БД записаны новые просмотры (с ограничением частоты)"""
+    cache = caches[PAGE_CACHE_ALIAS]
+    generation = cache.get(GENERATION_KEY.format("views"))
+    if generation is None or time.time_ns() - generation > VIEWS_GENERATION_INTERVAL * 10 ** 9:
+        _bump(["views"])
+
+
+def check_scheduled_publications():
+    """Сдвигает поколения, если наступило время запланированной публикации"""
+    next_at = default_cache.get(NEXT_PUBLICATION_KEY)
+    if next_at == NO_SCHEDULED_PUBLICATION or (next_at is not None and next_at > time.time()):
+        return
+    from .models import BlogPost
+
+    # Время пришло или неизвестно (ключ вытеснен, пост сохранён) — видимость могла измениться
+    _bump(["posts", "related"])
+    upcoming = (
+        BlogPost.objects.filter(is_published=True, is_moderated=True, published_at__gt=timezone.now())
+        .order_by("published_at").values_list("published_at", flat=True).first()
+    )
+    default_cache.set(
+        NEXT_PUBLICATION_KEY,
+        upcoming.timestamp() if upcoming else NO_SCHEDULED_PUBLICATION,
+        timeout=None,
+    )
+
+
+def forget_next_publication():
+    """Пересчитать время ближайшей публикации при следующем запросе (после коммита)"""
+    transaction.on_commit(lambda: default_cache.delete(NEXT_PUBLICATION_KEY))
+
+
+def invalidate_pages(*groups):
+    """Сбрасывает страницы, зависящие от групп, после коммита текущей транзакции"""
+    if groups:
+        transaction.on_commit(lambda: _bump(groups))
+
+
+class AnonymousPageCacheMixin:
+    """
+    Отдаёт GET-запросы анонимов из кэша страниц.
+    Запросы с неизвестными GET-параметрами идут мимо кэша.
+    """
+    page_cache_groups = ()
+    page_cache_query_params = ("page",)
+    page_cache_timeout = PAGE_CACHE_TIMEOUT
+
+    def get_page_cache_groups(self):
+        return self.page_cache_groups
+
+    def get_page_cache_extra(self):
+        """Данные, которые нужны при отдаче страницы из кэша (см. page_cache_hit)"""
+        return {}
+
+    def page_cache_hit(self, extra):
+        """Вызывается при отдаче страницы из кэша — для динамики вроде счётчика просмотров"""
+
+    def _page_cacheable(self, request):
+        if not PAGE_CACHE_ENABLED or request.method not in ("GET", "HEAD") or request.user.is_authenticated:
+            return False
+        return all(param in self.page_cache_query_params for param in request.GET)
+
+    def _page_state(self, request, generations):
+        """Ключ кэша и валидаторы страницы"""
+        query = "&".join(
+            f"{param}={request.GET[param]}" for param in self.page_cache_query_params if param in request.GET
+        )
+        digest = hashlib.md5(
+            f"{request.path}?{query}|{'.'.join(map(str, generations))}".encode()
+        ).hexdigest()
+        # ETag слабый: HTML отличается CSRF-токеном, смысл страницы — нет
+        etag = f'W/"{digest}"'
+        last_modified = max(generations) // 10 ** 9 if generations else None
+        return f"blog:page:{digest}", etag, last_modified
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self._page_cacheable(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        check_scheduled_publications()
+        cache = caches[PAGE_CACHE_ALIAS]
+        groups = self.get_page_cache_groups()
+        # Только чтение: поколение создаётся, когда страница отдала 200, —
+        # иначе боты, перебирающие несуществующие slug, забили бы кэш ключами post:<slug>
+        generations = _generations(groups, create=False)
+        if generations is None:
+            cache_result("page", False)
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code == 200:
+                # Страницу не кэшируем: её рендер мог начаться до правки, сдвинувшей поколение
+                _generations(groups)
+            return response
+
+        key, etag, last_modified = self._page_state(request, generations)
+        cached = cache.get(key)
+        cache_result("page", cached is not None)
+        if cached is not None:
+            content, content_type, extra = cached
+            self.page_cache_hit(extra)
+            # 304 — только для страницы, которая есть в кэше: значит, её вьюха отдала 200
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if not_modified is not None:
+                return self._set_validators(not_modified, etag, last_modified)
+            response = HttpResponse(content, content_type=content_type)
+            return self._finalize_page(request, response, "hit", etag, last_modified)
+
+        self._page_cache_render = True
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code != 200 or response.streaming:
+            return response
+        if hasattr(response, "render") and not response.is_rendered:
+            response.render()
+        if request.method == "GET":
+            cache.set(
+                key,
+                (response.content, response["Content-Type"], self.get_page_cache_extra()),
+                self.page_cache_timeout,
+            )
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return self._set_validators(not_modified, etag, last_modified)
+        return self._finalize_page(request, response, "miss", etag, last_modified)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if getattr(self, "_page_cache_render", False):
+            context["csrf_token"] = CSRF_PLACEHOLDER
+        return context
+
+    def _finalize_page(self, request, response, status, etag, last_modified):
+        placeholder = CSRF_PLACEHOLDER.encode()
+        if placeholder in response.content:
+            response.content = response.content.replace(placeholder, get_token(request).encode())
+        response["X-Page-Cache"] = status
+        return self._set_validators(response, etag, last_modified)
+
+    @staticmethod
+    def _set_validators(response, etag, last_modified):
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        return response
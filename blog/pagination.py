@@ -0,0 +1,108 @@
+# blog/pagination.py
+"""
+Keyset-пагинация списков постов по (published_at, id).
+
+Вместо OFFSET и COUNT(*) страница выбирается условием «строго раньше
+якорного поста» по составному индексу, поэтому глубокие страницы архива
+стоят столько же, сколько первая. Адреса страниц стабильные и короткие:
+?after=<id последнего поста> / ?before=<id первого поста>.
+"""
+from django.conf import settings
+from django.db.models import Q
+from django.http import Http404
+
+
+class KeysetPage:
+    """Минимальная замена django.core.paginator.Page для шаблонов"""
+    is_keyset = True
+    number = None
+
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        return self.object_list[-1].pk if self._has_next else None
+
+    @property
+    def previous_cursor(self):
+        return self.object_list[0].pk if self._has_previous else None
+
+    @property
+    def first_published_at(self):
+        return self.object_list[0].published_at if self.object_list else None
+
+
+class KeysetPaginationMixin:
+    """
+    Для ListView постов. pagination_mode = 'keyset' включает keyset-пагинацию
+    всегда, 'offset' — только если в запросе есть ?after= или ?before=.
+    """
+    pagination_mode = getattr(settings, 'POST_PAGINATION_MODE', 'offset')
+    page_cache_query_params = ('page', 'after', 'before')
+
+    def use_keyset(self):
+        return (
+                self.pagination_mode == 'keyset'
+                or 'after' in self.request.GET
+                or 'before' in self.request.GET
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_keyset():
+            return super().paginate_queryset(queryset, page_size)
+
+        after = self.request.GET.get('after')
+        before = self.request.GET.get('before')
+        if after:
+            anchor = self._get_anchor(queryset, after)
+            rows = list(
+                queryset.filter(
+                    Q(published_at__lt=anchor['published_at'])
+                    | Q(published_at=anchor['published_at'], pk__lt=anchor['pk'])
+                ).order_by('-published_at', '-pk')[:page_size + 1]
+            )
+            page = KeysetPage(rows[:page_size], len(rows) > page_size, True)
+        elif before:
+            anchor = self._get_anchor(queryset, before)
+            rows = list(
+                queryset.filter(
+                    Q(published_at__gt=anchor['published_at'])
+                    | Q(published_at=anchor['published_at'], pk__gt=anchor['pk'])
+                ).order_by('published_at', 'pk')[:page_size + 1]
+            )
+            page = KeysetPage(rows[:page_size][::-1], True, len(rows) > page_size)
+        else:
+            rows = list(queryset.order_by('-published_at', '-pk')[:page_size + 1])
+            page = KeysetPage(rows[:page_size], len(rows) > page_size, False)
+        return None, page, page.object_list, page.has_other_pages()
+
+    @staticmethod
+    def _get_anchor(queryset, cursor):
+        if not cursor.isdigit():
+            raise Http404("Неверный курсор страницы")
+        # Якорь ищется в том же списке: id черновика или чужого тега курсором не считается
+        anchor = (
+            queryset.filter(pk=cursor).prefetch_related(None).order_by()
+            .values('pk', 'published_at').first()
+        )
+        if anchor is None or anchor['published_at'] is None:
+            raise Http404("Страница не найдена")
+        return anchor
@@ -0,0 +1,229 @@
+# blog/performance.py
+"""
+Замеры каждого запроса: SQL (число и время), рендер шаблонов, рендер Markdown,
+обращения к хранилищу (S3) и размер ответа.
+
+Включается PERF_INSTRUMENTATION=true. Выключенный PerformanceMiddleware
+снимает себя из цепочки (MiddlewareNotUsed) и ничего не подменяет — остаётся
+только проверка ContextVar в timed() вокруг рендера Markdown.
+
+Персонал получает заголовок Server-Timing (видно во вкладке Network браузера).
+Запросы дольше PERF_SLOW_REQUEST_MS или с числом SQL больше
+PERF_SLOW_REQUEST_QUERIES пишутся в лог blog.performance одной JSON-строкой
+вместе с самыми долгими запросами.
+"""
+import functools
+import heapq
+import json
+import logging
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+ENABLED = getattr(settings, "PERF_INSTRUMENTATION", False)
+SLOW_REQUEST_MS = getattr(settings, "PERF_SLOW_REQUEST_MS", 500)
+SLOW_REQUEST_QUERIES = getattr(settings, "PERF_SLOW_REQUEST_QUERIES", 50)
+TOP_QUERIES = 5
+SQL_LOG_LENGTH = 1000
+
+# Методы хранилища, которые ходят в сеть (url() у S3 считается локально)
+STORAGE_METHODS = ("_open", "_save", "exists", "delete", "size", "listdir", "get_modified_time")
+
+_current = ContextVar("request_stats", default=None)
+
+
+class RequestStats:
+    """Счётчики одного запроса: {раздел: [число вызовов, секунды]} и самые долгие SQL"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sections = {}
+        self.slowest_queries = []  # куча (секунды, номер, sql)
+        self._depth = {}
+
+    def add(self, section, seconds):
+        entry = self.sections.setdefault(section, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def add_query(self, sql, seconds):
+        self.add("db", seconds)
+        item = (seconds, self.sections["db"][0], sql)
+        if len(self.slowest_queries) < TOP_QUERIES:
+            heapq.heappush(self.slowest_queries, item)
+        elif seconds > self.slowest_queries[0][0]:
+            heapq.heapreplace(self.slowest_queries, item)
+
+    def count(self, section):
+        return self.sections.get(section, (0, 0.0))[0]
+
+    def ms(self, section):
+        return self.sections.get(section, (0, 0.0))[1] * 1000
+
+    def enter(self, section):
+        """True, если это внешний вызов раздела (вложенные include/render не считаются дважды)"""
+        depth = self._depth.get(section, 0)
+        self._depth[section] = depth + 1
+        return depth == 0
+
+    def leave(self, section):
+        self._depth[section] -= 1
+
+
+def current_stats():
+    """Счётчики текущего запроса или None (замеры выключены, вне запроса)"""
+    return _current.get()
+
+
+def timed(section):
+    """Декоратор: время вызовов функции идёт в раздел section текущего запроса"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            stats = _current.get()
+            if stats is None:
+                return func(*args, **kwargs)
+            outer = stats.enter(section)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stats.leave(section)
+                if outer:
+                    stats.add(section, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add_query(sql, time.perf_counter() - started)
+
+
+class QueryTimer:
+    """
+    Число и точное время SQL внутри with — для benchmark_views и тестов.
+    Время в connection.queries округлено до миллисекунды, здесь — perf_counter
+    """
+
+    def __init__(self):
+        self.queries = []  # [(sql, секунды)]
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def __len__(self):
+        return len(self.queries)
+
+    @property
+    def ms(self):
+        return sum(seconds for _, seconds in self.queries) * 1000
+
+
+_installed = False
+
+
+def install_hooks():
+    """Оборачивает рендер шаблонов и методы хранилища (один раз на процесс)"""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    from django.core.files.storage import storages
+    from django.template.backends.django import Template
+
+    Template.render = timed("template")(Template.render)
+    storage_class = type(storages["default"])
+    for name in STORAGE_METHODS:
+        method = getattr(storage_class, name, None)
+        if method is not None:
+            setattr(storage_class, name, timed("storage")(method))
+
+
+class PerformanceMiddleware:
+    """Ставить первым в MIDDLEWARE — тогда в замер попадает вся цепочка"""
+
+    def __init__(self, get_response):
+        if not ENABLED:
+            raise MiddlewareNotUsed
+        install_hooks()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_query_wrapper))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        total_ms = (time.perf_counter() - stats.started) * 1000
+        size = None if response.streaming else len(response.content)
+        user = getattr(request, "user", None)
+        if user is not None and user.is_staff:
+            response["Server-Timing"] = self.server_timing(stats, total_ms)
+        if total_ms > SLOW_REQUEST_MS or stats.count("db") > SLOW_REQUEST_QUERIES:
+            self.log_slow_request(request, response, stats, total_ms, size)
+        return response
+
+    @staticmethod
+    def server_timing(stats, total_ms):
+        # Значение заголовка — только ASCII, поэтому описания по-английски
+        return ", ".join([
+            f'db;dur={stats.ms("db"):.1f};desc="SQL x{stats.count("db")}"',
+            f'tpl;dur={stats.ms("template"):.1f};desc="Templates"',
+            f'md;dur={stats.ms("markdown"):.1f};desc="Markdown x{stats.count("markdown")}"',
+            f'storage;dur={stats.ms("storage"):.1f};desc="Storage x{stats.count("storage")}"',
+            f"total;dur={total_ms:.1f}",
+        ])
+
+    @staticmethod
+    def log_slow_request(request, response, stats, total_ms, size):
+        match = getattr(request, "resolver_match", None)
+        record = {
+            "method": request.method,
+            "path": request.get_full_path(),
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "total_ms": round(total_ms, 1),
+            "bytes": size,
+            **{
+                section: {"count": stats.count(section), "ms": round(stats.ms(section), 1)}
+                for section in ("db", "template", "markdown", "storage")
+            },
+            "top_queries": [
+                {"ms": round(seconds * 1000, 2), "sql": sql[:SQL_LOG_LENGTH]}
+                for seconds, _, sql in sorted(stats.slowest_queries, reverse=True)
+            ],
+        }
+        logger.warning("slow request %s", json.dumps(record, ensure_ascii=False))
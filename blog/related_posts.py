@@ -0,0 +1,160 @@
+# blog/related_posts.py
+"""
+Расчёт похожих постов (блок «Читайте также» на странице поста).
+
+Близость двух постов складывается из трёх частей:
+  * общие теги — сумма IDF общих тегов, делённая на сумму IDF тегов поста;
+  * близость в дереве локаций — глубина общего предка (по материализованному
+    пути treebeard), делённая на глубину локации поста;
+  * похожесть текста — косинус TF-IDF по основам слов заголовка и описания
+    (только самые весомые слова каждого поста).
+
+Чтобы не сравнивать все пары постов, кандидаты собираются по инвертированным
+индексам «тег / предок локации / слово → посты». Слишком длинные списки
+обрезаются до самых свежих постов: общий тег у половины сайта почти ничего
+не говорит о похожести, а расчёт остаётся линейным по числу постов.
+"""
+import heapq
+import math
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+from django.db import transaction
+
+from .location_tree import get_location_tree
+from .russian_stemmer import stem
+from .search import WORD_RE
+
+TAG_WEIGHT = 0.5
+LOCATION_WEIGHT = 0.2
+TEXT_WEIGHT = 0.3
+
+TERMS_PER_POST = 8  # сколько самых весомых слов поста участвует в сравнении
+MAX_POSTING = 150  # предел длины списка «признак → посты»
+
+# Словарь сайта невелик, а стемминг — самая дорогая часть разбора текста
+_stem = lru_cache(maxsize=200_000)(stem)
+
+
+def _text_vectors(posts):
+    """Нормированные TF-IDF векторы по TERMS_PER_POST самым весомым основам"""
+    counts = {}
+    document_frequency = Counter()
+    for post in posts:
+        words = WORD_RE.findall(f"{post.title} {post.title} {post.meta_description or ''} {post.excerpt}")
+        terms = Counter(_stem(word.lower()) for word in words if len(word) >= 3 and not word.isdigit())
+        counts[post.pk] = terms
+        document_frequency.update(terms.keys())
+
+    total = len(posts)
+    vectors = {}
+    for pk, terms in counts.items():
+        weights = {
+            term: count * math.log(total / document_frequency[term])
+            for term, count in terms.items()
+            if document_frequency[term] > 1
+        }
+        top = heapq.nlargest(TERMS_PER_POST, weights.items(), key=lambda item: (item[1], item[0]))
+        norm = math.sqrt(sum(weight * weight for _, weight in top)) or 1.0
+        vectors[pk] = {term: weight / norm for term, weight in top if weight > 0}
+    return vectors
+
+
+def _postings(features):
+    """{признак: [id постов]} с обрезкой по MAX_POSTING; features — {id: признаки}, id по убыванию свежести"""
+    postings = defaultdict(list)
+    for pk, post_features in features.items():
+        for feature in post_features:
+            if len(postings[feature]) < MAX_POSTING:
+                postings[feature].append(pk)
+    return postings
+
+
+def compute_related(top_n=6):
+    """{id поста: [(id соседа, близость), ...]} для всех видимых постов"""
+    from .models import BlogPost
+
+    posts = list(
+        BlogPost.objects.visible()
+        .only('title', 'meta_description', 'excerpt', 'location_id', 'published_at')
+        .order_by('-published_at', '-pk')
+    )
+    if len(posts) < 2:
+        return {}
+    post_ids = [post.pk for post in posts]
+
+    # Теги: один запрос к промежуточной таблице
+    tags = defaultdict(set)
+    through = BlogPost.tags.through.objects.filter(blogpost_id__in=post_ids)
+    for post_id, tag_id in through.values_list('blogpost_id', 'tag_id').iterator(chunk_size=5000):
+        tags[post_id].add(tag_id)
+    tag_df = Counter(tag for post_tags in tags.values() for tag in post_tags)
+    tag_idf = {tag: math.log(1 + len(posts) / df) for tag, df in tag_df.items()}
+
+    # Локации: предки (включая саму локацию) с глубиной
+    tree = get_location_tree()
+    locations = {}
+    for post in posts:
+        chain = tree.ancestors(post.location_id)
+        node = tree.get(post.location_id)
+        if node is not None:
+            chain.append(node)
+        locations[post.pk] = {ancestor.pk: depth for depth, ancestor in enumerate(chain, start=1)}
+
+    vectors = _text_vectors(posts)
+
+    ordered_tags = {pk: tags.get(pk, ()) for pk in post_ids}
+    tag_postings = _postings(ordered_tags)
+    location_postings = _postings(locations)
+    term_postings = _postings(vectors)
+
+    related = {}
+    for pk in post_ids:
+        post_tags = tags.get(pk, set())
+        tag_total = sum(tag_idf[tag] for tag in post_tags) or 1.0
+        tag_scores = defaultdict(float)
+        for tag in post_tags:
+            for other in tag_postings[tag]:
+                tag_scores[other] += tag_idf[tag] / tag_total
+
+        post_locations = locations[pk]
+        depth = max(post_locations.values(), default=1)
+        location_scores = defaultdict(float)
+        for location_id, location_depth in post_locations.items():
+            for other in location_postings[location_id]:
+                location_scores[other] = max(location_scores[other], location_depth / depth)
+
+        text_scores = defaultdict(float)
+        for term, weight in vectors[pk].items():
+            for other in term_postings[term]:
+                text_scores[other] += weight * vectors[other][term]
+
+        candidates = (tag_scores.keys() | location_scores.keys() | text_scores.keys()) - {pk}
+        scored = (
+            (
+                TAG_WEIGHT * tag_scores.get(other, 0.0)
+                + LOCATION_WEIGHT * location_scores.get(other, 0.0)
+                + TEXT_WEIGHT * text_scores.get(other, 0.0),
+                other,
+            )
+            for other in candidates
+        )
+        # При равной близости выше более свежий пост (больший id)
+        related[pk] = [(other, score) for score, other in heapq.nlargest(top_n, scored) if score > 0]
+    return related
+
+
+def rebuild_related_posts(top_n=6, batch_size=1000):
+    """Пересчитывает таблицу RelatedPost целиком, возвращает число записанных пар"""
+    from .models import RelatedPost
+
+    related = compute_related(top_n=top_n)
+    rows = [
+        RelatedPost(post_id=pk, related_id=other, rank=rank, score=round(score, 4))
+        for pk, neighbours in related.items()
+        for rank, (other, score) in enumerate(neighbours, start=1)
+    ]
+    with transaction.atomic():
+        RelatedPost.objects.all().delete()
+        RelatedPost.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
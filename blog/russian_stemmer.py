@@ -0,0 +1,113 @@
+# blog/russian_stemmer.py
+"""
+Стеммер для русского языка по алгоритму Snowball (Russian stemming algorithm).
+
+Нужен поиску на SQLite: в FTS5 нет русского стемминга, поэтому слова запроса
+приводятся к основе здесь и ищутся как префиксы («казан*» найдёт «Казань»,
+«Казани», «казанский»). PostgreSQL стеммит сам (конфигурация 'russian').
+"""
+VOWELS = set("аеиоуыэюя")
+
+
+def _suffixes(*groups):
+    # Длинные окончания проверяются раньше коротких
+    return tuple(sorted({s for group in groups for s in group.split()}, key=len, reverse=True))
+
+
+# Окончания группы 1 допустимы только после «а» или «я»
+PERFECTIVE_GERUND_1 = _suffixes("в вши вшись")
+PERFECTIVE_GERUND_2 = _suffixes("ив ивши ившись ыв ывши ывшись")
+ADJECTIVE = _suffixes("ее ие ые ое ими ыми ей ий ый ой ем им ым ом его ого ему ому их ых ую юю ая яя ою ею")
+PARTICIPLE_1 = _suffixes("ем нн вш ющ щ")
+PARTICIPLE_2 = _suffixes("ивш ывш ующ")
+REFLEXIVE = _suffixes("ся сь")
+VERB_1 = _suffixes("ла на ете йте ли й л ем н ло но ет ют ны ть ешь нно")
+VERB_2 = _suffixes(
+    "ила ыла ена ейте уйте ите или ыли ей уй ил ыл им ым ен ило ыло ено ят ует уют ит ыт ены ить ыть ишь ую ю"
+)
+NOUN = _suffixes(
+    "а ев ов ие ье е иями ями ами еи ии и ией ей ой ий й иям ям ием ем ам ом о у ах иях ях ы ь ию ью ю ия ья я"
+)
+DERIVATIONAL = _suffixes("ост ость")
+SUPERLATIVE = _suffixes("ейш ейше")
+
+
+def _regions(word):
+    """Начала областей RV и R2 (индексы в слове)"""
+    rv = len(word)
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            rv = i + 1
+            break
+
+    def after_vc(start):
+        for i in range(start + 1, len(word)):
+            if word[i] not in VOWELS and word[i - 1] in VOWELS:
+                return i + 1
+        return len(word)
+
+    r1 = after_vc(0)
+    return rv, after_vc(r1)
+
+
+def _strip(rv, group_1=(), group_2=()):
+    """Отрезает самое длинное подходящее окончание; None, если ничего не подошло"""
+    for suffix in sorted(group_1 + group_2, key=len, reverse=True):
+        if not rv.endswith(suffix):
+            continue
+        if suffix in group_2:
+            return rv[:-len(suffix)]
+        if rv[:-len(suffix)][-1:] in ("а", "я"):
+            return rv[:-len(suffix)]
+    return None
+
+
+def stem(word):
+    word = word.lower().replace("ё", "е")
+    rv_start, r2_start = _regions(word)
+    head, rv = word[:rv_start], word[rv_start:]
+
+    # Шаг 1
+    stripped = _strip(rv, PERFECTIVE_GERUND_1, PERFECTIVE_GERUND_2)
+    if stripped is not None:
+        rv = stripped
+    else:
+        reflexive = _strip(rv, (), REFLEXIVE)
+        if reflexive is not None:
+            rv = reflexive
+        adjective = _strip(rv, (), ADJECTIVE)
+        if adjective is not None:
+            participle = _strip(adjective, PARTICIPLE_1, PARTICIPLE_2)
+            rv = adjective if participle is None else participle
+        else:
+            for group_1, group_2 in ((VERB_1, VERB_2), ((), NOUN)):
+                stripped = _strip(rv, group_1, group_2)
+                if stripped is not None:
+                    rv = stripped
+                    break
+
+    # Шаг 2
+    if rv.endswith("и"):
+        rv = rv[:-1]
+
+    # Шаг 3: словообразовательное окончание — только в R2
+    for suffix in DERIVATIONAL:
+        if rv.endswith(suffix) and rv_start + len(rv) - len(suffix) >= r2_start:
+            rv = rv[:-len(suffix)]
+            break
+
+    # Шаг 4
+    if rv.endswith("нн"):
+        rv = rv[:-1]
+    else:
+        for suffix in SUPERLATIVE:
+            if rv.endswith(suffix):
+                rv = rv[:-len(suffix)]
+                if rv.endswith("нн"):
+                    rv = rv[:-1]
+                break
+        else:
+            if rv.endswith("ь"):
+                rv = rv[:-1]
+
+    return head + rv
@@ -0,0 +1,241 @@
+# blog/search.py
+"""
+Полнотекстовый поиск по постам.
+
+Индекс лежит в отдельной таблице blog_post_search (создаётся миграцией):
+  * SQLite — виртуальная таблица FTS5, rowid = id поста. Русского стемминга
+    в FTS5 нет, поэтому слова запроса приводятся к основе в Python
+    (blog/russian_stemmer.py) и ищутся как префиксы;
+  * PostgreSQL — таблица с колонкой tsvector (конфигурация 'russian') и GIN-индексом.
+
+В индекс попадают все посты, видимость проверяется при выдаче — отложенная
+публикация не требует переиндексации. Индекс обновляется после коммита по
+сигналам (blog/signals.py) и целиком пересобирается командой rebuild_search_index.
+"""
+import re
+
+from django.db import connection as default_connection, transaction
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .location_tree import get_location_tree
+from .russian_stemmer import stem
+from .utils import html_to_text
+
+SEARCH_TABLE = "blog_post_search"
+MAX_RESULTS = 200
+SNIPPET_WORDS = 30
+WORD_RE = re.compile(r"\w+")
+# Маркеры подсветки: в тексте постов их нет, после экранирования становятся <mark>
+MARK_START, MARK_END = "\x02", "\x03"
+
+
+class SqliteSearchBackend:
+    # Веса колонок для bm25: title, description, body, tags, locations
+    WEIGHTS = (10.0, 4.0, 1.0, 6.0, 6.0)
+
+    def clear(self, cursor):
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+
+    def delete(self, cursor, post_ids):
+        cursor.executemany(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [(pk,) for pk in post_ids])
+
+    def upsert(self, cursor, documents):
+        self.delete(cursor, [pk for pk, _ in documents])
+        cursor.executemany(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, title, description, body, tags, locations) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            [(pk, *fields) for pk, fields in documents],
+        )
+
+    @staticmethod
+    def _match(query):
+        # «казани» → "казан"*; кавычки не дают словам стать синтаксисом FTS5
+        words = WORD_RE.findall(query)
+        # Предлоги и союзы («в», «по», «и») как префиксы нашли бы почти всё — пропускаем
+        words = [word for word in words if len(word) >= 3] or words
+        terms = []
+        for word in words:
+            base = stem(word)
+            terms.append(f'"{base if len(base) >= 3 else word.lower()}"*')
+        return " ".join(terms)
+
+    def search(self, cursor, query, limit):
+        match = self._match(query)
+        if not match:
+            return []
+        weights = ", ".join(map(str, self.WEIGHTS))
+        cursor.execute(
+            f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s "
+            f"ORDER BY bm25({SEARCH_TABLE}, {weights}) LIMIT %s",
+            [match, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    def snippets(self, cursor, query, post_ids):
+        match = self._match(query)
+        if not match or not post_ids:
+            return {}
+        placeholders = ", ".join(["%s"] * len(post_ids))
+        cursor.execute(
+            f"SELECT rowid, snippet({SEARCH_TABLE}, 2, %s, %s, '…', %s) FROM {SEARCH_TABLE} "
+            f"WHERE {SEARCH_TABLE} MATCH %s AND rowid IN ({placeholders})",
+            [MARK_START, MARK_END, SNIPPET_WORDS, match, *post_ids],
+        )
+        return dict(cursor.fetchall())
+
+
+class PostgresSearchBackend:
+    DOCUMENT_SQL = (
+        "setweight(to_tsvector('russian', %s), 'A') || "
+        "setweight(to_tsvector('russian', %s), 'B') || "
+        "setweight(to_tsvector('russian', %s), 'C') || "
+        "setweight(to_tsvector('russian', %s), 'B') || "
+        "setweight(to_tsvector('russian', %s), 'B')"
+    )
+
+    def clear(self, cursor):
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+
+    def delete(self, cursor, post_ids):
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE post_id = ANY(%s)", [list(post_ids)])
+
+    def upsert(self, cursor, documents):
+        # title, description, body, tags, locations — в порядке DOCUMENT_SQL
+        cursor.executemany(
+            f"INSERT INTO {SEARCH_TABLE} (post_id, body, document) VALUES (%s, %s, {self.DOCUMENT_SQL}) "
+            "ON CONFLICT (post_id) DO UPDATE SET body = EXCLUDED.body, document = EXCLUDED.document",
+            [(pk, fields[2], *fields) for pk, fields in documents],
+        )
+
+    def search(self, cursor, query, limit):
+        cursor.execute(
+            f"SELECT post_id FROM {SEARCH_TABLE}, websearch_to_tsquery('russian', %s) AS query "
+            "WHERE document @@ query ORDER BY ts_rank_cd(document, query) DESC LIMIT %s",
+            [query, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    def snippets(self, cursor, query, post_ids):
+        if not post_ids:
+            return {}
+        cursor.execute(
+            f"SELECT post_id, ts_headline('russian', body, websearch_to_tsquery('russian', %s), %s) "
+            f"FROM {SEARCH_TABLE} WHERE post_id = ANY(%s)",
+            [
+                query,
+                f"StartSel={MARK_START}, StopSel={MARK_END}, MaxWords={SNIPPET_WORDS}, MinWords=15",
+                list(post_ids),
+            ],
+        )
+        return dict(cursor.fetchall())
+
+
+BACKENDS = {
+    "sqlite": SqliteSearchBackend(),
+    "postgresql": PostgresSearchBackend(),
+}
+
+
+def get_backend(connection=default_connection):
+    """Бэкенд поиска для БД или None, если БД не поддерживается"""
+    return BACKENDS.get(connection.vendor)
+
+
+def build_documents(posts):
+    """(id, (title, description, body, tags, locations)) для каждого поста"""
+    tree = get_location_tree()
+    documents = []
+    for post in posts:
+        location_names = [node.name for node in tree.ancestors(post.location_id)]
+        location = tree.get(post.location_id)
+        if location is not None:
+            location_names.append(location.name)
+        documents.append((post.pk, (
+            post.title,
+            post.meta_description or "",
+            html_to_text(post.get_content_html()),
+            " ".join(tag.name for tag in post.tags.all()),
+            " ".join(location_names),
+        )))
+    return documents
+
+
+def index_posts(post_ids, batch_size=200):
+    """Обновляет записи индекса для постов (удалённые посты из индекса убираются)"""
+    from .models import BlogPost
+
+    backend = get_backend()
+    post_ids = sorted(set(post_ids))
+    if backend is None or not post_ids:
+        return 0
+    indexed = 0
+    for start in range(0, len(post_ids), batch_size):
+        chunk = post_ids[start:start + batch_size]
+        posts = list(BlogPost.objects.filter(pk__in=chunk).prefetch_related("tags"))
+        documents = build_documents(posts)
+        with transaction.atomic(), default_connection.cursor() as cursor:
+            backend.delete(cursor, set(chunk) - {post.pk for post in posts})
+            backend.upsert(cursor, documents)
+        indexed += len(documents)
+    return indexed
+
+
+def remove_posts(post_ids):
+    backend = get_backend()
+    if backend is not None and post_ids:
+        with default_connection.cursor() as cursor:
+            backend.delete(cursor, list(post_ids))
+
+
+def rebuild_search_index(batch_size=200):
+    """Пересобирает индекс целиком, возвращает число проиндексированных постов"""
+    from .models import BlogPost
+
+    backend = get_backend()
+    if backend is None:
+        return 0
+    with default_connection.cursor() as cursor:
+        backend.clear(cursor)
+    post_ids = list(BlogPost.objects.order_by("pk").values_list("pk", flat=True))
+    return index_posts(post_ids, batch_size=batch_size)
+
+
+def schedule_reindex(post_ids):
+    """Переиндексирует посты после коммита текущей транзакции"""
+    post_ids = list(post_ids)
+    if post_ids:
+        transaction.on_commit(lambda: index_posts(post_ids))
+
+
+def schedule_location_reindex(location):
+    """Имена локации и её предков входят в документы постов всего поддерева"""
+    from .models import BlogPost, Location
+
+    schedule_reindex(
+        BlogPost.objects.filter(location__in=Location.get_tree(location)).values_list("pk", flat=True)
+    )
+
+
+def search_post_ids(query, limit=MAX_RESULTS):
+    """id найденных постов по убыванию релевантности (без проверки видимости)"""
+    backend = get_backend()
+    query = " ".join(query.split())
+    if backend is None or not query:
+        return []
+    with default_connection.cursor() as cursor:
+        return backend.search(cursor, query, limit)
+
+
+def search_snippets(query, post_ids):
+    """Фрагменты текста с подсветкой найденных слов: {id поста: безопасный HTML}"""
+    backend = get_backend()
+    query = " ".join(query.split())
+    if backend is None or not query:
+        return {}
+    with default_connection.cursor() as cursor:
+        found = backend.snippets(cursor, query, list(post_ids))
+    return {
+        pk: mark_safe(escape(text).replace(MARK_START, "<mark>").replace(MARK_END, "</mark>"))
+        for pk, text in found.items()
+    }
@@ -0,0 +1,154 @@
+# blog/signals.py
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .image_variants import delete_variants, image_fields, refresh_object_variants, schedule
+from .location_tree import invalidate_location_tree
+from .models import AboutPage, AboutPageImage, BlogPost, Location, PostImage, PostRating, Tag
+from .page_cache import forget_next_publication, invalidate_pages
+from .search import remove_posts, schedule_location_reindex, schedule_reindex
+
+
+@receiver(post_delete, sender=PostRating)
+def rating_deleted(sender, instance, **kwargs):
+    """Удалённая оценка (например, из админки) вычитается из сводки поста"""
+    BlogPost.apply_rating_delta(instance.post_id, -instance.score, -1)
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def location_changed(sender, **kwargs):
+    invalidate_location_tree()
+    invalidate_pages('locations')
+
+
+# =============== Сброс кэша страниц ===============
+@receiver(pre_save, sender=BlogPost)
+def remember_post_slug(sender, instance, **kwargs):
+    # При смене slug надо сбросить и страницу по старому адресу
+    if instance.pk:
+        instance._old_slug = BlogPost.objects.filter(pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=BlogPost)
+@receiver(post_delete, sender=BlogPost)
+def post_changed(sender, instance, **kwargs):
+    groups = {'posts', f'post:{instance.slug}'}
+    old_slug = getattr(instance, '_old_slug', None)
+    if old_slug:
+        groups.add(f'post:{old_slug}')
+    invalidate_pages(*groups)
+    # Пост мог получить новую дату публикации в будущем
+    forget_next_publication()
+
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def post_tags_changed(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        # instance — пост или тег, в зависимости от стороны связи
+        groups = ['posts', 'tags']
+        if isinstance(instance, BlogPost):
+            groups.append(f'post:{instance.slug}')
+        invalidate_pages(*groups)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, **kwargs):
+    invalidate_pages('tags', 'posts')
+
+
+@receiver(post_save, sender=PostRating)
+@receiver(post_delete, sender=PostRating)
+def rating_changed(sender, instance, **kwargs):
+    post_slug = BlogPost.objects.filter(pk=instance.post_id).values_list('slug', flat=True).first()
+    invalidate_pages('posts', f'post:{post_slug}')
+
+
+@receiver(post_save, sender=PostImage)
+@receiver(post_delete, sender=PostImage)
+def gallery_changed(sender, instance, **kwargs):
+    post_slug = BlogPost.objects.filter(pk=instance.post_id).values_list('slug', flat=True).first()
+    invalidate_pages(f'post:{post_slug}')
+
+
+@receiver(post_save, sender=AboutPage)
+@receiver(post_delete, sender=AboutPage)
+@receiver(post_save, sender=AboutPageImage)
+@receiver(post_delete, sender=AboutPageImage)
+def about_changed(sender, **kwargs):
+    invalidate_pages('about')
+
+
+# =============== Поисковый индекс ===============
+@receiver(post_save, sender=BlogPost)
+def post_saved_reindex(sender, instance, **kwargs):
+    schedule_reindex([instance.pk])
+
+
+@receiver(post_delete, sender=BlogPost)
+def post_deleted_reindex(sender, instance, **kwargs):
+    post_id = instance.pk
+    transaction.on_commit(lambda: remove_posts([post_id]))
+
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def post_tags_reindex(sender, instance, action, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove'):
+        schedule_reindex([instance.pk] if isinstance(instance, BlogPost) else pk_set)
+    elif action == 'pre_clear':
+        # После очистки связи уже не узнать, каких постов она касалась
+        post_ids = [instance.pk] if isinstance(instance, BlogPost) else list(
+            instance.posts.values_list('pk', flat=True)
+        )
+        schedule_reindex(post_ids)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def tag_reindex(sender, instance, **kwargs):
+    # Имя тега входит в документ поста; при удалении посты запоминаем до каскада
+    schedule_reindex(instance.posts.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Location)
+def location_reindex(sender, instance, created, **kwargs):
+    if not created:
+        schedule_location_reindex(instance)
+
+
+# =============== Копии изображений для srcset ===============
+@receiver(pre_save, sender=BlogPost)
+@receiver(pre_save, sender=PostImage)
+@receiver(pre_save, sender=AboutPage)
+@receiver(pre_save, sender=AboutPageImage)
+def image_replaced(sender, instance, **kwargs):
+    image_field, variants_field, _ = image_fields()[sender]
+    variants = getattr(instance, variants_field) or {}
+    if variants and variants.get('source') != getattr(instance, image_field).name:
+        # Копии прежнего файла больше не подходят
+        setattr(instance, variants_field, {})
+        transaction.on_commit(lambda: delete_variants(variants))
+
+
+@receiver(post_save, sender=BlogPost)
+@receiver(post_save, sender=PostImage)
+@receiver(post_save, sender=AboutPage)
+@receiver(post_save, sender=AboutPageImage)
+def image_saved(sender, instance, **kwargs):
+    image_field, variants_field, _ = image_fields()[sender]
+    name = getattr(instance, image_field).name or None
+    if (getattr(instance, variants_field) or {}).get('source') != name:
+        schedule(refresh_object_variants, sender, instance.pk)
+
+
+@receiver(post_delete, sender=BlogPost)
+@receiver(post_delete, sender=PostImage)
+@receiver(post_delete, sender=AboutPage)
+@receiver(post_delete, sender=AboutPageImage)
+def image_deleted(sender, instance, **kwargs):
+    _, variants_field, _ = image_fields()[sender]
+    variants = getattr(instance, variants_field)
+    if variants:
+        transaction.on_commit(lambda: delete_variants(variants))
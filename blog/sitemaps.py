@@ -1,8 +1,9 @@
-from django.utils import timezone
+from django.db import models
 
 from django.contrib import sitemaps
 from django.urls import reverse
-from .models import BlogPost, Location, Tag, AboutPage
+from .location_tree import get_location_tree
+from .models import BlogPost, Tag, AboutPage
 
 class StaticViewSitemap(sitemaps.Sitemap):
     priority = 0.9
@@ -17,18 +18,19 @@ class StaticViewSitemap(sitemaps.Sitemap):
 class BlogPostSitemap(sitemaps.Sitemap):
     changefreq = "weekly"
     priority = 0.8
+    limit = 10000  # постов на страницу sitemap-posts.xml
 
     def items(self):
-        return BlogPost.objects.filter(
-            is_published=True,
-            is_moderated=True,
-            published_at__isnull=False,
-            published_at__lte=timezone.now()
-        ).order_by('-published_at')
+        # URL строится из снимка дерева локаций — из БД берём только нужные колонки
+        return BlogPost.objects.visible().only('slug', 'location_id', 'updated_at').order_by('-published_at', '-pk')
 
     def lastmod(self, obj):
         return obj.updated_at
 
+    def get_latest_lastmod(self):
+        # Штатная реализация перебирает все посты — здесь один агрегат
+        return self.items().aggregate(latest=models.Max('updated_at'))['latest']
+
     def location(self, obj):
         return obj.get_absolute_url()
 
@@ -37,7 +39,7 @@ class LocationSitemap(sitemaps.Sitemap):
     priority = 0.7
 
     def items(self):
-        return Location.objects.all()
+        return get_location_tree().all()
 
     def location(self, obj):
         return obj.get_absolute_url()
@@ -47,7 +49,7 @@ class TagSitemap(sitemaps.Sitemap):
     priority = 0.6
 
     def items(self):
-        return Tag.objects.all()
+        return Tag.objects.only('slug')
 
     def location(self, obj):
         return obj.get_absolute_url()
@@ -61,4 +63,22 @@ class AboutPageSitemap(sitemaps.Sitemap):
         return AboutPage.objects.filter(is_active=True)
 
     def location(self, obj):
-        return reverse('blog:about_page')
\ No newline at end of file
+        return reverse('blog:about_page')
+
+
+SITEMAPS = {
+    'static': StaticViewSitemap,
+    'posts': BlogPostSitemap,
+    'locations': LocationSitemap,
+    'tags': TagSitemap,
+    'about': AboutPageSitemap,
+}
+
+# От каких групп кэша страниц зависит каждый раздел (см. blog/page_cache.py)
+SITEMAP_CACHE_GROUPS = {
+    'static': (),
+    'posts': ('posts', 'locations'),
+    'locations': ('locations',),
+    'tags': ('tags',),
+    'about': ('about',),
+}
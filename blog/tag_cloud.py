@@ -0,0 +1,48 @@
+# blog/tag_cloud.py
+"""
+Облако тегов: теги с числом публично видимых постов и весом для отображения.
+Строится одним агрегирующим запросом и хранится в общем кэше, пока не сменятся
+поколения групп 'tags' и 'posts' (см. blog/page_cache.py).
+"""
+from django.core.cache import cache
+from django.db import models
+
+from .page_cache import generation_token
+
+CACHE_KEY = "blog:tag_cloud:{}"
+CACHE_TIMEOUT = 24 * 60 * 60
+WEIGHTS = 5
+
+
+def build_tag_cloud():
+    from .models import Tag, visible_posts_q
+
+    tags = Tag.objects.annotate(
+        public_posts_count=models.Count('posts', filter=visible_posts_q(prefix='posts__'))
+    ).order_by('name')
+
+    cloud = [
+        {
+            'name': tag.name,
+            'slug': tag.slug,
+            'url': tag.get_absolute_url(),
+            'count': tag.public_posts_count,
+            'weight': 1,
+        }
+        for tag in tags
+    ]
+    max_count = max((item['count'] for item in cloud), default=0)
+    if max_count:
+        for item in cloud:
+            item['weight'] = 1 + round((WEIGHTS - 1) * item['count'] / max_count)
+    return cloud
+
+
+def get_tag_cloud():
+    """Список словарей name, slug, url, count, weight (1..5), отсортированный по имени"""
+    key = CACHE_KEY.format(generation_token(('tags', 'posts')))
+    cloud = cache.get(key)
+    if cloud is None:
+        cloud = build_tag_cloud()
+        cache.set(key, cloud, CACHE_TIMEOUT)
+    return cloud
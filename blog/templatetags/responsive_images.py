@@ -0,0 +1,28 @@
+# blog/templatetags/responsive_images.py
+from django import template
+
+from blog.image_variants import picture_sources
+
+register = template.Library()
+
+
+@register.inclusion_tag("blog/partials/picture.html")
+def picture(image, variants, sizes, alt="", css_class="", lazy=True):
+    """
+    <picture> с AVIF/WebP-копиями (blog/image_variants.py) и исходником в <img>.
+    Пока копий нет, выводится только исходник. Размеры, цвет и размытая заглушка
+    берутся из того же описания копий — без обращения к хранилищу.
+    """
+    variants = variants or {}
+    return {
+        "src": image.url,
+        "sources": picture_sources(variants),
+        "sizes": sizes,
+        "alt": alt,
+        "css_class": css_class,
+        "lazy": lazy,
+        "width": variants.get("width"),
+        "height": variants.get("height"),
+        "color": variants.get("color"),
+        "placeholder": variants.get("placeholder"),
+    }
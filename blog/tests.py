@@ -1,3 +1,144 @@
-from django.test import TestCase
+"""
+Бюджеты SQL-запросов публичных страниц.
 
-# Create your tests here.
+Данные генерирует generate_benchmark_data (маленький набор, SQLite подходит).
+Новый URL без записи в QUERY_BUDGETS роняет тест — бюджет нужно объявить сразу.
+Запуск: python manage.py test blog
+"""
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+from blog import view_counter, views
+from blog.models import AboutPage, BlogPost, Location, Tag
+from blog.performance import QueryTimer
+from blog.search import rebuild_search_index
+
+# Бюджет страницы: (не больше запросов, не больше мс на все запросы).
+# Счётчики — для тёплых кэшей процесса (снимок дерева локаций и т.п.) и пустого кэша страниц
+QUERY_BUDGETS = {
+    "robots_txt": (0, 50),
+    "sitemap_index": (4, 200),
+    "sitemap_section": (2, 200),
+    "yandex-verification": (0, 50),
+    "blog:health-check": (1, 100),
+    "blog:home": (3, 200),
+    "blog:location_root": (0, 200),
+    "blog:location_detail": (3, 200),
+    "blog:post_archive": (2, 200),
+    "blog:post_detail": (5, 200),
+    "blog:tag_list": (1, 200),
+    "blog:tag_detail": (4, 200),
+    "blog:best_posts": (3, 200),
+    "blog:popular_posts": (3, 200),
+    "blog:about_page": (2, 200),
+    "blog:search": (5, 200),
+}
+# Не публичные страницы: админка, загрузка картинок редактором, POST-оценка, метрики по токену
+NOT_BUDGETED = {"markdownx_upload", "markdownx_markdownify", "blog:post_rate", "blog:metrics"}
+
+# Постраничные списки: число запросов не должно зависеть от размера страницы
+PAGINATED_VIEWS = {
+    "blog:home": views.PostListView,
+    "blog:post_archive": views.PostArchiveView,
+    "blog:location_detail": views.LocationDetailView,
+    "blog:tag_detail": views.TagDetailView,
+    "blog:best_posts": views.BestPostsView,
+    "blog:popular_posts": views.PopularPostsView,
+    "blog:search": views.SearchView,
+}
+SMALL_PAGE, LARGE_PAGE = 2, 25
+
+
+def url_names(patterns=None, namespace=""):
+    """Имена всех URL проекта вместе с пространствами имён (админка пропускается)"""
+    names = set()
+    for pattern in get_resolver().url_patterns if patterns is None else patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace == "admin":
+                continue
+            prefix = f"{namespace}{pattern.namespace}:" if pattern.namespace else namespace
+            names |= url_names(pattern.url_patterns, prefix)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(f"{namespace}{pattern.name}")
+    return names
+
+
+@override_settings(
+    CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests-default"},
+        "pages": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests-pages"},
+    },
+    ALLOWED_HOSTS=["testserver"],
+)
+class QueryBudgetTests(TestCase):
+    """Число и время SQL-запросов публичных страниц на сгенерированных данных"""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            "generate_benchmark_data",
+            posts=80, tags=20, views=400, ratings=200, bodies=5, covers=0,
+            locations="2,2,2,2", force=True, stdout=StringIO(),
+        )
+        rebuild_search_index()
+        about = AboutPage(title="О нас", slug="about", content_markdown="Текст страницы", is_active=True)
+        about.save()
+        visible = BlogPost.objects.visible()
+        cls.post = visible.select_related("location").order_by("-ratings_count").first()
+        cls.location = Location.objects.filter(depth=1, slug__startswith="bench-").first()
+        cls.tag = Tag.objects.filter(posts__in=visible).order_by("pk").first()
+
+    def setUp(self):
+        spool = tempfile.TemporaryDirectory()
+        self.addCleanup(spool.cleanup)
+        for name, value in (("SPOOL_DIR", spool.name), ("BACKGROUND_FLUSH", False)):
+            patcher = mock.patch.object(view_counter, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def url_for(self, name):
+        kwargs = {
+            "sitemap_section": {"section": "posts"},
+            "blog:location_detail": {"location_path": self.location.get_path_slug()},
+            "blog:post_detail": {"location_path": self.post.location.get_path_slug(), "slug": self.post.slug},
+            "blog:tag_detail": {"slug": self.tag.slug},
+        }.get(name, {})
+        url = reverse(name, kwargs=kwargs)
+        return f"{url}?q=путешествие маршрут" if name == "blog:search" else url
+
+    def measure(self, url):
+        """(число запросов, мс) для запроса с пустым кэшем страниц"""
+        self.client.get(url)  # прогрев кэшей процесса
+        caches["pages"].clear()
+        with QueryTimer() as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return queries, queries.ms
+
+    def test_every_public_url_has_budget(self):
+        missing = url_names() - QUERY_BUDGETS.keys() - NOT_BUDGETED
+        self.assertFalse(missing, f"Нет бюджета запросов для: {sorted(missing)}")
+
+    def test_query_budgets(self):
+        for name, (max_queries, max_ms) in QUERY_BUDGETS.items():
+            with self.subTest(name):
+                queries, query_ms = self.measure(self.url_for(name))
+                sql = "\n".join(sql for sql, _ in queries.queries)
+                self.assertLessEqual(len(queries), max_queries, f"{name}:\n{sql}")
+                self.assertLessEqual(query_ms, max_ms, name)
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        for name, view_class in PAGINATED_VIEWS.items():
+            with self.subTest(name):
+                counts = []
+                for size in (SMALL_PAGE, LARGE_PAGE):
+                    with mock.patch.object(view_class, "paginate_by", size):
+                        queries, _ = self.measure(self.url_for(name))
+                    counts.append(len(queries))
+                self.assertEqual(counts[0], counts[1], f"{name}: {SMALL_PAGE} → {LARGE_PAGE} постов на странице")
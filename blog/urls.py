@@ -8,6 +8,7 @@ app_name = 'blog'
 urlpatterns = [
     # Docker health-check view
     path('health/', docker_views.health_view, name='health-check'),
+    path('metrics/', docker_views.metrics_view, name='metrics'),
 
     # Главная — список последних постов
     path('', views.PostListView.as_view(), name='home'),
@@ -31,6 +32,9 @@ urlpatterns = [
     # О нас
     path('about/', views.AboutPageView.as_view(), name='about_page'),
 
+    # Поиск
+    path('search/', views.SearchView.as_view(), name='search'),
+
     # Оценка поста
     path('post_rate/<int:post_id>/', views.PostRatingView.as_view(), name='post_rate'),
 ]
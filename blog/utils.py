@@ -1,10 +1,19 @@
+import hashlib
 import re
+from html import unescape
 from typing import Dict
 
 import markdown
 import bleach
+from django.utils.html import strip_tags
 from django.utils.safestring import mark_safe
 
+from blog.performance import timed
+
+# Версия рендерера Markdown. Увеличивать при любом изменении markdownify_with_video
+# (расширения, шорткоды, правила bleach, <picture> для картинок) — сохранённый HTML будет пересобран.
+MARKDOWN_RENDERER_VERSION = 2
+
 def markdownify(text):
     # Безопасный рендеринг
     allowed_tags = [
@@ -44,6 +53,7 @@ def convert_rutube_shortcodes(html):
     pattern = r'\{\{\s*rutube:\s*([a-zA-Z0-9_-]+)\s*\}\}'
     return re.sub(pattern, replace_rutube, html, flags=re.IGNORECASE)
 
+@timed("markdown")
 def markdownify_with_video(text):
     """Рендерит Markdown + Rutube-плееры"""
     if not text:
@@ -85,12 +95,38 @@ def markdownify_with_video(text):
     return mark_safe(clean_html)
 
 
+def markdown_content_hash(text):
+    """SHA-256 от исходного Markdown — по нему определяем, устарел ли сохранённый HTML"""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def html_to_text(html):
+    """Простой текст из HTML одной строкой"""
+    # Границы блоков превращаем в пробелы, иначе абзацы слипнутся
+    html = re.sub(r'<(br|hr|/p|/h[1-6]|/li|/div|/blockquote|/pre)\b[^>]*>', ' ', html or "", flags=re.IGNORECASE)
+    return " ".join(unescape(strip_tags(html)).split())
+
+
+def html_to_excerpt(html, max_chars=300):
+    """Простой текст из HTML для карточек и meta description, обрезанный по слову"""
+    text = html_to_text(html)
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars - 1].rsplit(" ", 1)[0] + "…"
+
+
 def add_title_to_context(context: Dict, base_title: str) -> Dict:
     """
     Если это не первая страница пагинации, добавляет в контекст титул
-    с указанием номера страницы
+    с указанием номера страницы (для keyset-пагинации — даты первой записи)
     """
-    if context['page_obj'].number > 1:
+    page_obj = context['page_obj']
+    if getattr(page_obj, 'is_keyset', False):
+        if page_obj.has_previous() and page_obj.first_published_at:
+            context['title_suffix'] = f" — записи до {page_obj.first_published_at:%d.%m.%Y}"
+            context['full_title'] = base_title + context['title_suffix']
+        return context
+    if page_obj.number > 1:
         context['title_suffix'] = f" — Страница {context['page_obj'].number}"
         context['full_title'] = base_title + context['title_suffix']
     return context
@@ -0,0 +1,231 @@
+# blog/view_counter.py
+"""
+Асинхронный счётчик просмотров.
+
+Запрос к PostDetailView только дописывает строку в локальный спул-файл
+(свой у каждого процесса и каждого интервала времени) — без обращений к БД.
+Фоновый поток воркера (или команда flush_post_views) раз в несколько секунд
+забирает закрытые интервалы, отсекает повторы (пост, IP) за 24 часа,
+создаёт PostView одним bulk_create и сдвигает views_count одним UPDATE.
+
+Спул лежит на диске, поэтому перезапуск воркера не теряет просмотры, а
+повторная обработка файла (падение между коммитом и удалением) не даёт
+двойного счёта — такие просмотры уже есть в PostView. Файл, который БД не
+принимает даже отдельно от остальных, переименовывается в *.bad и больше
+не мешает сбросу.
+"""
+import fcntl
+import ipaddress
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection, models, transaction
+from django.utils import timezone
+
+from .page_cache import touch_views_generation
+
+logger = logging.getLogger(__name__)
+
+SPOOL_DIR = getattr(settings, "VIEW_COUNTER_SPOOL_DIR", os.path.join(settings.BASE_DIR, "spool", "views"))
+FLUSH_INTERVAL = getattr(settings, "VIEW_COUNTER_FLUSH_INTERVAL", 15)
+BACKGROUND_FLUSH = getattr(settings, "VIEW_COUNTER_BACKGROUND_FLUSH", True)
+
+# Длина интервала спул-файла в секундах. Файл обрабатывается, только когда
+# его интервал закрыт (с запасом в один интервал на запись «на границе»).
+BUCKET_SECONDS = 5
+DEDUP_WINDOW = timedelta(hours=24)
+UPDATE_CHUNK = 500
+
+_seen = {}  # (post_id, ip) -> время истечения
+_seen_lock = threading.Lock()
+_seen_pruned_at = 0.0
+_flusher = None
+
+
+def normalize_ip(value):
+    """
+    IP клиента из REMOTE_ADDR или X-Forwarded-For (берётся первый адрес цепочки)
+    в каноническом виде или None, если это не IP-адрес
+    """
+    if not value:
+        return None
+    try:
+        return str(ipaddress.ip_address(value.split(",", 1)[0].strip()))
+    except ValueError:
+        return None
+
+
+def record_post_view(post_id, ip_address):
+    """
+    Ставит просмотр в очередь. Возвращает True, если этот воркер не видел
+    такой пары (пост, IP) последние 24 часа — тогда просмотр будет засчитан
+    (окончательная проверка по БД — при сбросе). Просмотры без корректного IP
+    не считаются.
+    """
+    ip_address = normalize_ip(ip_address)
+    if ip_address is None:
+        return False
+    now = time.time()
+    key = (post_id, ip_address)
+    with _seen_lock:
+        _prune_seen(now)
+        expires = _seen.get(key)
+        if expires is not None and expires > now:
+            return False
+        _seen[key] = now + DEDUP_WINDOW.total_seconds()
+
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    bucket = int(now // BUCKET_SECONDS)
+    path = os.path.join(SPOOL_DIR, f"{bucket}-{os.getpid()}.log")
+    with open(path, "a", encoding="utf-8") as spool:
+        spool.write(f"{post_id}\t{ip_address}\n")
+
+    if BACKGROUND_FLUSH:
+        _ensure_flusher()
+    return True
+
+
+def pending_views_count():
+    """Сколько просмотров лежит в спуле и ещё не записано в БД"""
+    total = 0
+    for path in _spool_files(include_open=True):
+        with open(path, encoding="utf-8") as spool:
+            total += sum(1 for _ in spool)
+    return total
+
+
+def flush_post_views(include_open=False):
+    """
+    Переносит накопленные просмотры в БД. Возвращает число засчитанных просмотров.
+    include_open=True забирает и текущие интервалы (для команды при остановке сервиса).
+    """
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    with open(os.path.join(SPOOL_DIR, ".lock"), "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return 0  # сбрасывает другой воркер
+        try:
+            return _flush_locked(include_open)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _spool_files(include_open=False):
+    if not os.path.isdir(SPOOL_DIR):
+        return []
+    current_bucket = int(time.time() // BUCKET_SECONDS)
+    files = []
+    for name in os.listdir(SPOOL_DIR):
+        if not name.endswith(".log"):
+            continue
+        bucket = int(name.split("-", 1)[0])
+        if include_open or bucket < current_bucket - 1:
+            files.append(os.path.join(SPOOL_DIR, name))
+    return sorted(files)
+
+
+def _flush_locked(include_open):
+    files = _spool_files(include_open)
+    if not files:
+        return 0
+    try:
+        return _flush_files(files)
+    except DatabaseError:
+        logger.exception("Не удалось сбросить просмотры пачкой, сбрасываем по файлам")
+
+    # Один испорченный файл не должен навсегда останавливать весь спул
+    counted = 0
+    for path in files:
+        try:
+            counted += _flush_files([path])
+        except DatabaseError:
+            logger.exception("Файл просмотров не принят БД, откладываем в %s.bad", path)
+            os.replace(path, f"{path}.bad")
+    return counted
+
+
+def _flush_files(files):
+    from .models import BlogPost, PostView
+
+    keys = set()
+    for path in files:
+        with open(path, encoding="utf-8") as spool:
+            for line in spool:
+                post_id, _, ip_address = line.rstrip("\n").partition("\t")
+                ip_address = normalize_ip(ip_address)
+                if post_id.isdigit() and ip_address:
+                    keys.add((int(post_id), ip_address))
+
+    post_ids = {post_id for post_id, _ in keys}
+    existing_posts = set(BlogPost.objects.filter(pk__in=post_ids).values_list("pk", flat=True))
+    already_viewed = set(
+        PostView.objects.filter(
+            post_id__in=post_ids,
+            ip_address__in={ip for _, ip in keys},
+            created_at__gte=timezone.now() - DEDUP_WINDOW,
+        ).values_list("post_id", "ip_address")
+    )
+    new_views = sorted(
+        key for key in keys
+        if key[0] in existing_posts and key not in already_viewed
+    )
+
+    with transaction.atomic():
+        PostView.objects.bulk_create(
+            [PostView(post_id=post_id, ip_address=ip) for post_id, ip in new_views],
+            batch_size=UPDATE_CHUNK,
+            ignore_conflicts=True,
+        )
+        increments = sorted(Counter(post_id for post_id, _ in new_views).items())
+        for start in range(0, len(increments), UPDATE_CHUNK):
+            chunk = increments[start:start + UPDATE_CHUNK]
+            BlogPost.objects.filter(pk__in=[post_id for post_id, _ in chunk]).update(
+                views_count=models.F("views_count") + models.Case(
+                    *[models.When(pk=post_id, then=models.Value(count)) for post_id, count in chunk],
+                    output_field=models.PositiveIntegerField(),
+                )
+            )
+
+    for path in files:
+        os.remove(path)
+    if new_views:
+        touch_views_generation()
+    return len(new_views)
+
+
+def _prune_seen(now):
+    """Убирает истёкшие пары не чаще раза за FLUSH_INTERVAL. Вызывать под _seen_lock"""
+    global _seen_pruned_at
+    if now - _seen_pruned_at < FLUSH_INTERVAL:
+        return
+    _seen_pruned_at = now
+    for key in [key for key, expires in _seen.items() if expires <= now]:
+        del _seen[key]
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush_post_views()
+        except Exception:
+            logger.exception("Не удалось сбросить просмотры в БД")
+        finally:
+            connection.close()
+
+
+def _ensure_flusher():
+    global _flusher
+    # После fork (gunicorn) поток родителя не существует — проверяем живость
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _seen_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_flush_loop, name="view-counter-flush", daemon=True)
+            _flusher.start()
@@ -1,31 +1,34 @@
-from datetime import timedelta
+from urllib.parse import quote
 
-from django.db import models
 from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404, render
+from django.contrib.sitemaps import views as sitemap_views
 from django.views import View
 from django.views.generic import ListView, DetailView
-from django.utils import timezone
 from django.urls import reverse
-from markdownx.views import markdownify_func
+from markdownx.views import ImageUploadView, markdownify_func
 
-from .models import BlogPost, Location, Tag, PostView, PostRating, AboutPage
-from .utils import markdownify_with_video, add_title_to_context
+from .forms import ContentImageForm
+from .location_tree import get_location_tree
+from .page_cache import AnonymousPageCacheMixin
+from .pagination import KeysetPaginationMixin
+from .search import search_post_ids, search_snippets
+from .sitemaps import SITEMAPS, SITEMAP_CACHE_GROUPS
+from .tag_cloud import get_tag_cloud
+from .models import BlogPost, Location, Tag, PostRating, AboutPage
+from .utils import add_title_to_context
+from .view_counter import record_post_view
 
 
-class PostListView(ListView):
+class PostListView(KeysetPaginationMixin, AnonymousPageCacheMixin, ListView):
     model = BlogPost
     template_name = 'blog/post_list.html'
     context_object_name = 'posts'
     paginate_by = 10
+    page_cache_groups = ('posts', 'tags', 'locations', 'views')
 
     def get_queryset(self):
-        return BlogPost.objects.filter(
-            is_published=True,
-            is_moderated=True,
-            published_at__isnull=False,
-            published_at__lte=timezone.now()
-        ).select_related('author', 'location')
+        return BlogPost.objects.visible().for_cards().order_by('-published_at', '-pk')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -34,44 +37,41 @@ class PostListView(ListView):
         return context
 
 
-class PostArchiveView(ListView):
+class PostArchiveView(KeysetPaginationMixin, AnonymousPageCacheMixin, ListView):
     model = BlogPost
     template_name = 'blog/post_archive.html'
     context_object_name = 'posts'
     paginate_by = 20
+    pagination_mode = 'keyset'  # архив обходят краулеры — без OFFSET и COUNT(*)
+    page_cache_groups = ('posts', 'tags', 'locations', 'views')
 
     def get_queryset(self):
-        return BlogPost.objects.filter(
-            is_published=True,
-            is_moderated=True,
-            published_at__isnull=False,
-            published_at__lte=timezone.now()
-        ).select_related('author', 'location').order_by('-published_at')
+        return BlogPost.objects.visible().for_cards().order_by('-published_at', '-pk')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['breadcrumbs'] = [("Главная", "/"), ("Архив", "/posts/")]
+        context = add_title_to_context(context, "Архив записей")
         return context
 
 
-class PostDetailView(DetailView):
+class PostDetailView(AnonymousPageCacheMixin, DetailView):
     model = BlogPost
     template_name = 'blog/post_detail.html'
     context_object_name = 'post'
+    page_cache_query_params = ()
 
     def get_object(self, queryset=None):
         location_path = self.kwargs['location_path'].rstrip('/')
         slug = self.kwargs['slug']
-        # Находим локацию
-        slug_parts = location_path.split('/')
-        try:
-            location = Location.objects.get(slug=slug_parts[-1])
-            if location.get_path_slug() != location_path:
-                raise Location.DoesNotExist
-        except Location.DoesNotExist:
+        # Находим локацию по материализованному пути в снимке дерева
+        location = get_location_tree().get_by_slug_path(location_path)
+        if location is None:
             raise Http404("Локация не найдена")
 
         post = get_object_or_404(BlogPost, slug=slug, location=location)
+        # Локация уже есть в снимке — хлебные крошки и шаблон не пойдут за ней в БД
+        post.location = location
 
         # Режим предпросмотра: только для авторизованных (в т.ч. из админки)
         preview = self.request.GET.get('preview') == '1'
@@ -84,58 +84,59 @@ class PostDetailView(DetailView):
                 raise Http404()
 
         # Счётчик просмотров — только в обычном режиме
-        if not preview:
-            ip = self.request.META.get('HTTP_X_FORWARDED_FOR', self.request.META.get('REMOTE_ADDR'))
-            if ip:
-                day_ago = timezone.now() - timedelta(hours=24)
-                if not PostView.objects.filter(
-                        post=post,
-                        ip_address=ip,
-                        created_at__gte=day_ago
-                ).exists():
-                    PostView.objects.create(post=post, ip_address=ip)
-                    BlogPost.objects.filter(pk=post.pk).update(views_count=models.F('views_count') + 1)
-                    post.views_count += 1
+        if not preview and self.count_view(post.pk):
+            post.views_count += 1
 
         return post
 
+    def count_view(self, post_id):
+        ip = self.request.META.get('HTTP_X_FORWARDED_FOR', self.request.META.get('REMOTE_ADDR'))
+        # Просмотр уходит в очередь, в БД его пишет фоновый сброс (blog/view_counter.py)
+        return bool(ip) and record_post_view(post_id, ip)
+
+    def get_page_cache_groups(self):
+        return ('tags', 'locations', 'views', 'related', f"post:{self.kwargs['slug']}")
+
+    def get_page_cache_extra(self):
+        return {'post_id': self.object.pk}
+
+    def page_cache_hit(self, extra):
+        # Страница из кэша, но просмотр всё равно считаем
+        self.count_view(extra['post_id'])
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['breadcrumbs'] = self.object.get_breadcrumbs()
-        context["content_markdown_safe"] = markdownify_with_video(self.object.content_markdown)
+        context["content_markdown_safe"] = self.object.get_content_html()
+        context['related_posts'] = self.object.get_related_posts()
         return context
 
 
-class LocationDetailView(ListView):
+class LocationDetailView(KeysetPaginationMixin, AnonymousPageCacheMixin, ListView):
     template_name = 'blog/location_detail.html'
     context_object_name = 'posts'
     paginate_by = 10  # ← пагинация
+    page_cache_groups = ('posts', 'tags', 'locations', 'views')
 
     def get_queryset(self):
         location_path = self.kwargs['location_path'].rstrip('/')
-        slug_parts = location_path.split('/')
-        try:
-            location = Location.objects.get(slug=slug_parts[-1])
-            if location.get_path_slug() != location_path:
-                raise Location.DoesNotExist
-        except Location.DoesNotExist:
+        location = get_location_tree().get_by_slug_path(location_path)
+        if location is None:
             raise Http404("Локация не найдена")
 
         # Сохраняем локацию в self.location для использования в get_context_data
         self.location = location
 
         # Все посты в этой локации и её подлокациях
-        descendants = list(location.get_descendants()) + [location]
-        return BlogPost.objects.filter(
-            location__in=descendants,
-            is_published=True,
-            is_moderated=True,
-            published_at__lte=timezone.now()
-        ).select_related('author', 'location').order_by('-published_at')
+        location_ids = get_location_tree().descendant_ids(location.pk)
+        return BlogPost.objects.visible().filter(
+            location_id__in=location_ids
+        ).for_cards().order_by('-published_at', '-pk')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['location'] = self.location
+        context['sublocations'] = self.location.get_cached_children()
 
         # Хлебные крошки
         crumbs = [("Главная", "/")]
@@ -146,34 +147,38 @@ class LocationDetailView(ListView):
         context = add_title_to_context(context, self.location.name)
         return context
 
-class RootLocationListView(ListView):
+class RootLocationListView(AnonymousPageCacheMixin, ListView):
     model = Location
     template_name = 'blog/location_root.html'
     context_object_name = 'locations'
+    page_cache_groups = ('locations',)
 
     def get_queryset(self):
-        return Location.get_root_nodes()
+        return get_location_tree().roots
 
 
-class TagListView(ListView):
+class TagListView(AnonymousPageCacheMixin, ListView):
     model = Tag
     template_name = 'blog/tag_list.html'
     context_object_name = 'tags'
-    queryset = Tag.objects.all()
+    page_cache_groups = ('tags', 'posts')
+
+    def get_queryset(self):
+        # Готовое облако тегов с числом публичных постов (blog/tag_cloud.py)
+        return get_tag_cloud()
+
 
-class TagDetailView(ListView):
+class TagDetailView(KeysetPaginationMixin, AnonymousPageCacheMixin, ListView):
     template_name = 'blog/tag_detail.html'
     context_object_name = 'posts'
     paginate_by = 10  # как на главной
+    page_cache_groups = ('posts', 'tags', 'locations', 'views')
 
     def get_queryset(self):
         self.tag = get_object_or_404(Tag, slug=self.kwargs['slug'])
-        return BlogPost.objects.filter(
-            tags=self.tag,
-            is_published=True,
-            is_moderated=True,
-            published_at__lte=timezone.now()
-        ).select_related('author', 'location').order_by('-published_at')
+        return BlogPost.objects.visible().filter(
+            tags=self.tag
+        ).for_cards().order_by('-published_at', '-pk')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -188,6 +193,38 @@ class TagDetailView(ListView):
         return context
 
 
+class SearchView(ListView):
+    """Поиск по постам (blog/search.py). Мимо кэша страниц — запросы у всех разные."""
+    template_name = 'blog/search.html'
+    context_object_name = 'post_ids'
+    paginate_by = 10
+
+    def get_queryset(self):
+        self.query = self.request.GET.get('q', '').strip()[:200]
+        post_ids = search_post_ids(self.query)
+        if not post_ids:
+            return []
+        # Индекс не знает о видимости — фильтруем, сохраняя порядок релевантности
+        visible = set(BlogPost.objects.visible().filter(pk__in=post_ids).values_list('pk', flat=True))
+        return [pk for pk in post_ids if pk in visible]
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page_ids = list(context['page_obj'].object_list)
+        posts = BlogPost.objects.for_cards().in_bulk(page_ids)
+        snippets = search_snippets(self.query, page_ids)
+        context['posts'] = []
+        for pk in page_ids:
+            post = posts[pk]
+            post.search_snippet = snippets.get(pk)
+            context['posts'].append(post)
+        context['query'] = self.query
+        context['pagination_params'] = f"q={quote(self.query)}&"
+        context['breadcrumbs'] = [("Главная", "/"), ("Поиск", None)]
+        context = add_title_to_context(context, f"Поиск: {self.query}" if self.query else "Поиск")
+        return context
+
+
 class PostRatingView(View):
     def post(self, request, post_id):
         post = get_object_or_404(BlogPost, pk=post_id)
@@ -200,13 +237,9 @@ class PostRatingView(View):
 
         ip = request.META.get('HTTP_X_FORWARDED_FOR', request.META.get('REMOTE_ADDR'))
         if ip:
-            # Обновляем или создаём оценку
-            PostRating.objects.update_or_create(
-                post=post,
-                ip_address=ip,
-                defaults={'score': score}
-            )
-            # Обновляем кэшированные значения (если бы они были) — пока не нужно
+            # Обновляем или создаём оценку вместе со сводкой на посте
+            PostRating.rate(post, ip, score)
+            post.refresh_from_db(fields=['ratings_sum', 'ratings_count', 'ratings_avg'])
         else:
             return HttpResponse("Не удалось определить IP", status=400)
 
@@ -215,23 +248,15 @@ class PostRatingView(View):
         return render(request, 'blog/partials/post_rating.html', context)
 
 
-class BestPostsView(ListView):
+class BestPostsView(AnonymousPageCacheMixin, ListView):
     model = BlogPost
     template_name = 'blog/best_posts.html'
     context_object_name = 'posts'
     paginate_by = 10
+    page_cache_groups = ('posts', 'tags', 'locations', 'views')
 
     def get_queryset(self):
-        return BlogPost.objects.filter(
-            is_published=True,
-            is_moderated=True,
-            published_at__isnull=False,
-            published_at__lte=timezone.now()
-        ).annotate(
-            avg_rating=models.Avg('ratings__score')
-        ).filter(
-            avg_rating__isnull=False
-        ).order_by('-avg_rating', '-views_count').select_related('author', 'location')
+        return BlogPost.objects.visible().best().for_cards()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -242,19 +267,15 @@ class BestPostsView(ListView):
         return context
 
 
-class PopularPostsView(ListView):
+class PopularPostsView(AnonymousPageCacheMixin, ListView):
     model = BlogPost
     template_name = 'blog/popular_posts.html'
     context_object_name = 'posts'
     paginate_by = 10
+    page_cache_groups = ('posts', 'tags', 'locations', 'views')
 
     def get_queryset(self):
-        return BlogPost.objects.filter(
-            is_published=True,
-            published_at__isnull=False,
-            is_moderated=True,
-            published_at__lte=timezone.now()
-        ).order_by('-views_count', '-published_at').select_related('author', 'location')[:10]
+        return BlogPost.objects.visible().order_by('-views_count', '-published_at').for_cards()[:10]
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -265,10 +286,11 @@ class PopularPostsView(ListView):
         return context
 
 
-class AboutPageView(DetailView):
+class AboutPageView(AnonymousPageCacheMixin, DetailView):
     model = AboutPage
     template_name = 'blog/about_page.html'
     context_object_name = 'page'
+    page_cache_groups = ('about',)
 
     def get_object(self, queryset=None):
         # Всегда возвращаем единственную активную запись
@@ -281,15 +303,43 @@ class AboutPageView(DetailView):
             ("О нас", None)
         ]
         # Рендерим контент с поддержкой Rutube и безопасным HTML
-        context['content_safe'] = markdownify_with_video(self.object.content_markdown)
+        context['content_safe'] = self.object.get_content_html()
         return context
 
 
+class SitemapIndexView(AnonymousPageCacheMixin, View):
+    """sitemap.xml — индекс разделов и их страниц; готовый XML лежит в кэше страниц"""
+    page_cache_groups = ('posts', 'tags', 'locations', 'about')
+    page_cache_query_params = ()
+    page_cache_timeout = 24 * 60 * 60
+
+    def get(self, request):
+        return sitemap_views.index(request, SITEMAPS, sitemap_url_name='sitemap_section')
+
+
+class SitemapSectionView(AnonymousPageCacheMixin, View):
+    """sitemap-<раздел>.xml?p=N — одна страница раздела"""
+    page_cache_query_params = ('p',)
+    page_cache_timeout = 24 * 60 * 60
+
+    def get_page_cache_groups(self):
+        return SITEMAP_CACHE_GROUPS.get(self.kwargs['section'], ())
+
+    def get(self, request, section):
+        return sitemap_views.sitemap(request, SITEMAPS, section=section)
+
+
+class ContentImageUploadView(ImageUploadView):
+    """Загрузка картинок из редактора markdownx (с построением копий для srcset)"""
+    form_class = ContentImageForm
+
+
 def robots_txt(request):
     lines = [
         "User-Agent: *",
         "Disallow: /admin/",
         "Disallow: /markdownx/",
+        "Disallow: /search/",
         # добавляем страницы старого домена, которые надо убрать из индексации (замечание Яндекс Вебмастер)
         "Disallow: /category/%D0%B1%D0%B5%D0%B7-%D1%80%D1%83%D0%B1%D1%80%D0%B8%D0%BA%D0%B8",
         "Disallow: /kuda-poehat-v-rossii/aktualnye-novosti",
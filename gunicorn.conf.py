@@ -1,5 +1,18 @@
+import os
+
 bind = "0.0.0.0:8000"
 workers = 3
 timeout = 300
 accesslog = "-"
-errorlog = "-"
\ No newline at end of file
+errorlog = "-"
+
+# Общий каталог метрик воркеров (blog/metrics.py) — тот же путь, что METRICS_DIR в settings
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "spool", "metrics"))
+
+
+def on_starting(server):
+    """Файлы метрик прошлого запуска удаляем до старта воркеров — счётчики начинаются с нуля"""
+    if os.path.isdir(METRICS_DIR):
+        for name in os.listdir(METRICS_DIR):
+            if name.endswith((".json", ".tmp")):
+                os.remove(os.path.join(METRICS_DIR, name))
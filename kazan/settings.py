@@ -51,6 +51,9 @@ INSTALLED_APPS = [
 SITE_ID = 1  # обязательно
 
 MIDDLEWARE = [
+    # Первыми — чтобы замер охватывал всю цепочку (blog/metrics.py, blog/performance.py)
+    'blog.metrics.MetricsMiddleware',
+    'blog.performance.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -127,6 +130,68 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# Cache
+# Файловый кэш общий для всех воркеров gunicorn в контейнере
+# (версия снимка дерева локаций и т.п.)
+CACHE_DIR = Path(os.getenv('CACHE_DIR', BASE_DIR / 'cache'))
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR / 'default',
+    },
+    # Готовые страницы для анонимов (blog/page_cache.py)
+    'pages': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR / 'pages',
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
+    },
+}
+
+# Кэш страниц для анонимов
+PAGE_CACHE_ENABLED = os.getenv('PAGE_CACHE_ENABLED', 'true').lower() == 'true'
+PAGE_CACHE_TIMEOUT = 600  # сек.
+# Счётчики просмотров на кэшированных страницах (и ETag) обновляются не чаще раза в час
+PAGE_CACHE_VIEWS_INTERVAL = 3600
+
+# Как часто воркер сверяет версию дерева локаций с общим кэшем (сек.)
+LOCATION_TREE_CHECK_INTERVAL = 1.0
+
+# Счётчик просмотров: очередь на диске, сброс в БД фоновым потоком воркера
+VIEW_COUNTER_SPOOL_DIR = os.getenv('VIEW_COUNTER_SPOOL_DIR', os.path.join(BASE_DIR, 'spool', 'views'))
+VIEW_COUNTER_FLUSH_INTERVAL = 15  # сек.
+
+# Сколько дней хранить сырые строки PostView (старше — только суточные сводки)
+POST_VIEW_RETENTION_DAYS = int(os.getenv('POST_VIEW_RETENTION_DAYS', 90))
+
+# Уменьшенные AVIF/WebP-копии изображений для srcset (строятся в фоне после сохранения)
+IMAGE_VARIANT_WIDTHS = (400, 800, 1200, 1600)
+IMAGE_VARIANTS_WORKERS = 2  # потоков на воркер gunicorn
+
+# Замеры запросов (blog/performance.py): Server-Timing для персонала и журнал медленных запросов
+PERF_INSTRUMENTATION = os.getenv('PERF_INSTRUMENTATION', 'false').lower() == 'true'
+PERF_SLOW_REQUEST_MS = int(os.getenv('PERF_SLOW_REQUEST_MS', 500))
+PERF_SLOW_REQUEST_QUERIES = int(os.getenv('PERF_SLOW_REQUEST_QUERIES', 50))
+
+# Метрики для Prometheus (blog/metrics.py): /metrics/ с заголовком Authorization: Bearer <METRICS_TOKEN>.
+# Воркеры gunicorn пишут метрики в общий каталог, его очищает gunicorn.conf.py при старте
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(BASE_DIR, 'spool', 'metrics'))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Медленные запросы — в stderr (его собирает gunicorn/docker)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'blog.performance': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
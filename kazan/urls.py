@@ -1,24 +1,15 @@
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.contrib.sitemaps.views import sitemap
 from django.urls import path, include
 from django.views.generic import TemplateView
 
-from blog.sitemaps import StaticViewSitemap, BlogPostSitemap, LocationSitemap, TagSitemap, AboutPageSitemap
-from blog.views import robots_txt
+from blog.views import robots_txt, ContentImageUploadView, SitemapIndexView, SitemapSectionView
 from kazan import settings
 
-sitemaps = {
-    'static': StaticViewSitemap,
-    'posts': BlogPostSitemap,
-    'locations': LocationSitemap,
-    'tags': TagSitemap,
-    'about': AboutPageSitemap,
-}
-
 urlpatterns = [
     path('robots.txt', robots_txt, name='robots_txt'),
-    path('sitemap.xml', sitemap, {'sitemaps': sitemaps}, name='django.contrib.sitemaps.views.sitemap'),
+    path('sitemap.xml', SitemapIndexView.as_view(), name='sitemap_index'),
+    path('sitemap-<section>.xml', SitemapSectionView.as_view(), name='sitemap_section'),
     path(
         'yandex_c9d84c93bcab45a5.html',
         TemplateView.as_view(template_name='verification/yandex_c9d84c93bcab45a5.html'),
@@ -26,6 +17,8 @@ urlpatterns = [
     ),
 
     path('admin/', admin.site.urls),
+    # Своя загрузка картинок — раньше штатной, чтобы строить копии для srcset
+    path('markdownx/upload/', ContentImageUploadView.as_view(), name='markdownx_upload'),
     path('markdownx/', include('markdownx.urls')),
     path('', include('blog.urls')),
 ]